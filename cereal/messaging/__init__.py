@@ -3,12 +3,13 @@ from .messaging_pyx import Context, Poller, SubSocket, PubSocket  # pylint: disa
 from .messaging_pyx import MultiplePublishersError, MessagingError  # pylint: disable=no-name-in-module, import-error
 import os
 import capnp
+import numpy as np
 
-from typing import Optional, List, Union
-from collections import deque
+from typing import Dict, Optional, List, Tuple, Union
 
 from cereal import log
 from cereal.services import service_list
+from .stats import log_header_from_bytes, open_stats
 
 assert MultiplePublishersError
 assert MessagingError
@@ -30,8 +31,15 @@ context = Context()
 def log_from_bytes(dat: bytes) -> capnp.lib.capnp._DynamicStructReader:
   return log.Event.from_bytes(dat, traversal_limit_in_words=NO_TRAVERSAL_LIMIT)
 
-def new_message(service: Optional[str] = None, size: Optional[int] = None) -> capnp.lib.capnp._DynamicStructBuilder:
-  dat = log.Event.new_message()
+def log_from_bytes_many(dats: List[bytes]) -> List[capnp.lib.capnp._DynamicStructReader]:
+  """Decode a batch of messages in a single pass over one contiguous buffer"""
+  if not dats:
+    return []
+  return list(log.Event.read_multiple_bytes(b"".join(dats), traversal_limit_in_words=NO_TRAVERSAL_LIMIT))
+
+def new_message(service: Optional[str] = None, size: Optional[int] = None,
+                num_first_segment_words: Optional[int] = None) -> capnp.lib.capnp._DynamicStructBuilder:
+  dat = log.Event.new_message(num_first_segment_words=num_first_segment_words)
   dat.logMonoTime = int(sec_since_boot() * 1e9)
   dat.valid = True
   if service is not None:
@@ -61,39 +69,13 @@ def sub_sock(endpoint: str, poller: Optional[Poller] = None, addr: str = "127.0.
 
 def drain_sock_raw(sock: SubSocket, wait_for_one: bool = False) -> List[bytes]:
   """Receive all message currently available on the queue"""
-  ret: List[bytes] = []
-  while 1:
-    if wait_for_one and len(ret) == 0:
-      dat = sock.receive()
-    else:
-      dat = sock.receive(non_blocking=True)
-
-    if dat is None:
-      break
-
-    ret.append(dat)
-
-  return ret
+  return sock.receive_many(wait_for_one)
 
 def drain_sock(sock: SubSocket, wait_for_one: bool = False) -> List[capnp.lib.capnp._DynamicStructReader]:
   """Receive all message currently available on the queue"""
-  ret: List[capnp.lib.capnp._DynamicStructReader] = []
-  while 1:
-    if wait_for_one and len(ret) == 0:
-      dat = sock.receive()
-    else:
-      dat = sock.receive(non_blocking=True)
+  return log_from_bytes_many(sock.receive_many(wait_for_one))
 
-    if dat is None:  # Timeout hit
-      break
-
-    dat = log_from_bytes(dat)
-    ret.append(dat)
 
-  return ret
-
-
-# TODO: print when we drop packets?
 def recv_sock(sock: SubSocket, wait: bool = False) -> Union[None, capnp.lib.capnp._DynamicStructReader]:
   """Same as drain sock, but only returns latest message. Consider using conflate instead."""
   dat = None
@@ -133,19 +115,99 @@ def recv_one_retry(sock: SubSocket) -> capnp.lib.capnp._DynamicStructReader:
     if dat is not None:
       return log_from_bytes(dat)
 
+class LazyServiceDict(dict):
+  """Data dict of a lazy SubMaster, decodes the pending raw message of a service on access"""
+  def __init__(self, sm: "SubMaster"):
+    super().__init__()
+    self.sm = sm
+
+  def __getitem__(self, s: str):
+    if s in self.sm.pending:
+      self.sm.decode(s)
+    return super().__getitem__(s)
+
+  def get(self, s, default=None):
+    return self[s] if s in self else default
+
+  def values(self):
+    self.sm.decode_all()
+    return super().values()
+
+  def items(self):
+    self.sm.decode_all()
+    return super().items()
+
+
+class ServiceArray():
+  """dict-like view of a numpy array that holds one value per service slot"""
+  def __init__(self, slots: Dict[str, int], arr: np.ndarray):
+    self.slots = slots
+    self.arr = arr
+
+  def __getitem__(self, s: str):
+    return self.arr.item(self.slots[s])
+
+  def __setitem__(self, s: str, v) -> None:
+    self.arr[self.slots[s]] = v
+
+  def __contains__(self, s) -> bool:
+    return s in self.slots
+
+  def __iter__(self):
+    return iter(self.slots)
+
+  def __len__(self) -> int:
+    return len(self.slots)
+
+  def __repr__(self) -> str:
+    return repr(dict(self.items()))
+
+  def get(self, s: str, default=None):
+    return self[s] if s in self.slots else default
+
+  def keys(self):
+    return self.slots.keys()
+
+  def values(self):
+    return self.arr.tolist()
+
+  def items(self):
+    return zip(self.slots, self.arr.tolist())
+
+
 class SubMaster():
   def __init__(self, services: List[str], poll: Optional[List[str]] = None,
                ignore_alive: Optional[List[str]] = None, ignore_avg_freq: Optional[List[str]] = None,
-               addr: str = "127.0.0.1"):
+               addr: str = "127.0.0.1", lazy: bool = False, stats_name: Optional[str] = None):
     self.frame = -1
-    self.updated = {s: False for s in services}
-    self.rcv_time = {s: 0. for s in services}
-    self.rcv_frame = {s: 0 for s in services}
-    self.alive = {s: False for s in services}
-    self.recv_dts = {s: deque([0.0] * AVG_FREQ_HISTORY, maxlen=AVG_FREQ_HISTORY) for s in services}
+
+    # bookkeeping is kept in arrays indexed by service slot, exposed as dicts through ServiceArray
+    self.slots = {s: i for i, s in enumerate(dict.fromkeys(services))}
+    n = len(self.slots)
+    self._updated = np.zeros(n, dtype=bool)
+    self._rcv_time = np.zeros(n)
+    self._rcv_frame = np.zeros(n, dtype=np.int64)
+    self._alive = np.zeros(n, dtype=bool)
+    self.updated = ServiceArray(self.slots, self._updated)
+    self.rcv_time = ServiceArray(self.slots, self._rcv_time)
+    self.rcv_frame = ServiceArray(self.slots, self._rcv_frame)
+    self.alive = ServiceArray(self.slots, self._alive)
+
+    # ring buffer of receive intervals with a running sum, so the average frequency check is O(1)
+    self.recv_dts = [[0.] * AVG_FREQ_HISTORY for _ in range(n)]
+    self.recv_dts_pos = [0] * n
+    self.recv_dts_total = [0.] * n
+    self._recv_dts_sum = np.zeros(n)
+
     self.sock = {}
+    self.sock_service = {}
     self.freq = {}
-    self.data = {}
+
+    # in lazy mode only the raw bytes are kept on update, a message is decoded on first access to its data.
+    # valid and logMonoTime are read from the raw bytes, so validity checks don't decode anything
+    self.lazy = lazy
+    self.pending: Dict[str, bytes] = {}
+    self.data = LazyServiceDict(self) if lazy else {}
     self.valid = {}
     self.logMonoTime = {}
 
@@ -160,6 +222,7 @@ class SubMaster():
       if addr is not None:
         p = self.poller if s not in self.non_polled_services else None
         self.sock[s] = sub_sock(s, poller=p, addr=addr, conflate=True)
+        self.sock_service[self.sock[s]] = s
       self.freq[s] = service_list[s].frequency
 
       try:
@@ -171,10 +234,37 @@ class SubMaster():
       self.logMonoTime[s] = 0
       self.valid[s] = data.valid
 
+    # arbitrary small number to avoid float comparison. If freq is 0, the service is always alive
+    freq = np.array([self.freq[s] for s in self.slots])
+    check_freq = freq > 1e-5
+    self._track_freq = [self.freq[s] > 1e-5 and (s not in self.non_polled_services) and (s not in self.ignore_average_freq)
+                        for s in self.slots]
+    with np.errstate(divide='ignore'):
+      # alive if delay is within 10x the expected frequency
+      self._max_delay = np.where(check_freq, 10. / freq, np.inf)
+      # alive if average frequency is higher than 90% of expected frequency, compared as a sum over the history
+      self._max_dt_sum = np.where(check_freq, AVG_FREQ_HISTORY / (freq * 0.90), np.inf)
+
+    # optional latency, jitter and drop telemetry, published to a shared memory page
+    self.stats = None
+    if stats_name is not None:
+      self.stats = open_stats(f"{stats_name}_sub", list(self.slots), freq.tolist())
+
   def __getitem__(self, s: str) -> capnp.lib.capnp._DynamicStructReader:
     return self.data[s]
 
   def update(self, timeout: int = 1000) -> None:
+    if self.lazy:
+      raw = []
+      for sock in self.poller.poll(timeout):
+        raw.append((self.sock_service[sock], sock.receive(non_blocking=True)))
+
+      # non-blocking receive for non-polled sockets
+      for s in self.non_polled_services:
+        raw.append((s, self.sock[s].receive(non_blocking=True)))
+      self.update_raw(sec_since_boot(), raw)
+      return
+
     msgs = []
     for sock in self.poller.poll(timeout):
       msgs.append(recv_one_or_none(sock))
@@ -186,40 +276,78 @@ class SubMaster():
 
   def update_msgs(self, cur_time: float, msgs: List[capnp.lib.capnp._DynamicStructReader]) -> None:
     self.frame += 1
-    self.updated = dict.fromkeys(self.updated, False)
+    updated = []
     for msg in msgs:
       if msg is None:
         continue
 
       s = msg.which()
-      self.updated[s] = True
-
-      if self.rcv_time[s] > 1e-5 and self.freq[s] > 1e-5 and (s not in self.non_polled_services) \
-        and (s not in self.ignore_average_freq):
-        self.recv_dts[s].append(cur_time - self.rcv_time[s])
-
-      self.rcv_time[s] = cur_time
-      self.rcv_frame[s] = self.frame
+      updated.append(self.slots[s])
+      self.pending.pop(s, None)
       self.data[s] = getattr(msg, s)
       self.logMonoTime[s] = msg.logMonoTime
       self.valid[s] = msg.valid
+      if self.stats is not None:
+        self.stats.record(self.slots[s], cur_time, msg.logMonoTime)
 
-      if SIMULATION:
-        self.alive[s] = True
+    self._update_bookkeeping(cur_time, updated)
+    if self.stats is not None:
+      self.stats.publish(cur_time)
 
-    if not SIMULATION:
-      for s in self.data:
-        # arbitrary small number to avoid float comparison. If freq is 0, we can skip the check
-        if self.freq[s] > 1e-5:
-          # alive if delay is within 10x the expected frequency
-          self.alive[s] = (cur_time - self.rcv_time[s]) < (10. / self.freq[s])
+  def update_raw(self, cur_time: float, msgs: List[Tuple[str, Optional[bytes]]]) -> None:
+    """Like update_msgs, but takes (service, raw bytes) pairs that are only decoded on access"""
+    self.frame += 1
+    updated = []
+    for s, dat in msgs:
+      if dat is None:
+        continue
 
-          # alive if average frequency is higher than 90% of expected frequency
-          avg_dt = sum(self.recv_dts[s]) / AVG_FREQ_HISTORY
-          expected_dt = 1 / (self.freq[s] * 0.90)
-          self.alive[s] = self.alive[s] and (avg_dt < expected_dt)
-        else:
-          self.alive[s] = True
+      updated.append(self.slots[s])
+      self.pending[s] = dat
+      log_mono_time, valid = log_header_from_bytes(dat)
+      self.logMonoTime[s] = log_mono_time
+      self.valid[s] = valid
+      if self.stats is not None:
+        self.stats.record(self.slots[s], cur_time, log_mono_time)
+
+    self._update_bookkeeping(cur_time, updated)
+    if self.stats is not None:
+      self.stats.publish(cur_time)
+
+  def decode(self, s: str) -> None:
+    msg = log_from_bytes(self.pending.pop(s))
+    dict.__setitem__(self.data, s, getattr(msg, s))
+
+  def decode_all(self) -> None:
+    for s in list(self.pending):
+      self.decode(s)
+
+  def _update_bookkeeping(self, cur_time: float, updated: List[int]) -> None:
+    self._updated.fill(False)
+    if updated:
+      for i in updated:
+        last_rcv_time = self._rcv_time.item(i)
+        if last_rcv_time > 1e-5 and self._track_freq[i]:
+          dt = cur_time - last_rcv_time
+          dts, pos = self.recv_dts[i], self.recv_dts_pos[i]
+          total = self.recv_dts_total[i] + dt - dts[pos]
+          dts[pos] = dt
+          pos = (pos + 1) % AVG_FREQ_HISTORY
+          if pos == 0:
+            # resync the running sum once per cycle, so float errors don't accumulate
+            total = sum(dts)
+          self.recv_dts_pos[i] = pos
+          self.recv_dts_total[i] = total
+          self._recv_dts_sum[i] = total
+
+      self._updated[updated] = True
+      self._rcv_time[self._updated] = cur_time
+      self._rcv_frame[self._updated] = self.frame
+
+    if SIMULATION:
+      self._alive[self._updated] = True
+    else:
+      np.logical_and((cur_time - self._rcv_time) < self._max_delay, self._recv_dts_sum < self._max_dt_sum, out=self._alive)
 
   def all_alive(self, service_list=None) -> bool:
     if service_list is None:  # check all
@@ -237,15 +365,38 @@ class SubMaster():
     return self.all_alive(service_list=service_list) and self.all_valid(service_list=service_list)
 
 class PubMaster():
-  def __init__(self, services: List[str]):
+  def __init__(self, services: List[str], stats_name: Optional[str] = None):
     self.sock = {}
+    # words needed by the last message sent per service, see new_message
+    self.segment_words: Dict[str, int] = {}
     for s in services:
       self.sock[s] = pub_sock(s)
 
+    # optional send interval jitter telemetry, published to a shared memory page
+    self.stats = None
+    if stats_name is not None:
+      self.stats_slots = {s: i for i, s in enumerate(self.sock)}
+      self.stats = open_stats(f"{stats_name}_pub", list(self.sock), [service_list[s].frequency for s in self.sock],
+                              latency=False)
+
+  def new_message(self, s: str, size: Optional[int] = None) -> capnp.lib.capnp._DynamicStructBuilder:
+    """Same as messaging.new_message, but the builder's first segment is sized after the last message
+    sent on s. The message then fits a single, right sized allocation instead of a default 8 KiB
+    segment, or a chain of segments that have to be gathered again on serialization."""
+    return new_message(s, size, num_first_segment_words=self.segment_words.get(s))
+
   def send(self, s: str, dat: Union[bytes, capnp.lib.capnp._DynamicStructBuilder]) -> None:
     if not isinstance(dat, bytes):
       dat = dat.to_bytes()
+    # leave some headroom for messages with variable length lists
+    words = len(dat) // 8
+    self.segment_words[s] = words + words // 8
     self.sock[s].send(dat)
 
+    if self.stats is not None:
+      t = sec_since_boot()
+      self.stats.record(self.stats_slots[s], t)
+      self.stats.publish(t)
+
   def all_readers_updated(self, s: str) -> bool:
     return self.sock[s].all_readers_updated()
@@ -119,6 +119,26 @@ cdef class SubSocket:
 
       return m
 
+  def receive_many(self, bool wait_for_one=False):
+    """Receive all messages currently available on the queue in a single call"""
+    cdef list ret = []
+    cdef cppMessage * msg
+    cdef bool non_blocking = not wait_for_one
+
+    while True:
+      msg = self.socket.receive(non_blocking)
+      if msg == NULL:
+        if errno.errno == errno.EINTR:
+          print("SIGINT received, exiting")
+          sys.exit(1)
+        break
+
+      ret.append(msg.getData()[:msg.getSize()])
+      del msg
+      non_blocking = True
+
+    return ret
+
 
 cdef class PubSocket:
   cdef cppPubSocket * socket
@@ -0,0 +1,149 @@
+import os
+import struct
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from cereal import log
+
+STATS_DIR = os.getenv("MSG_STATS_DIR", "/dev/shm")
+STATS_INTERVAL = 1.  # seconds between updates of the stats page
+
+# upper edges of the jitter histogram bins, jitter is the distance of an interval to the expected interval
+JITTER_BINS_MS = [0.5, 1., 2., 5., 10., 20., 50., 100., float('inf')]
+
+STATS_DTYPE = np.dtype([
+  ('service', 'S32'),
+  ('count', '<u8'),            # messages seen since start
+  ('dropped', '<u8'),          # messages missed since start, estimated from the service frequency
+  ('latency_ms', '<f4'),       # mean publish to receive latency over the last interval, nan for publishers
+  ('max_latency_ms', '<f4'),   # max publish to receive latency over the last interval, nan for publishers
+  ('jitter_hist', '<u4', (len(JITTER_BINS_MS),)),  # since start
+])
+
+
+def stats_path(name: str) -> str:
+  return os.path.join(STATS_DIR, f"msgstats_{name}")
+
+
+def root_data_section(dat: bytes) -> Optional[Tuple[int, int]]:
+  """Byte offset and size of the root struct's data section in an unpacked capnp message.
+  None when the root isn't a plain struct pointer into the first segment, e.g. a far pointer"""
+  if len(dat) < 8:
+    return None
+  num_segments = struct.unpack_from("<I", dat, 0)[0] + 1
+  root = (4 + 4 * num_segments + 7) // 8 * 8
+  if root + 8 > len(dat):
+    return None
+  seg0_end = root + 8 * struct.unpack_from("<I", dat, 4)[0]
+  if seg0_end > len(dat) or seg0_end < root + 8:
+    return None
+
+  # root pointer: tag in the low two bits, 0 is a struct. the data section starts offset words after the
+  # pointer, its size in words is in the low half of the second word
+  offset, sizes = struct.unpack_from("<iI", dat, root)
+  if offset & 3 != 0:
+    return None
+  start = root + 8 + 8 * (offset >> 2)
+  size = 8 * (sizes & 0xFFFF)
+  if start < root + 8 or start + size > seg0_end:
+    return None
+  return start, size
+
+
+# Event.valid is a single bit of the data section, stored xor'ed with its default
+_VALID_SLOT = log.Event.schema.fields['valid'].proto.slot
+VALID_BIT = _VALID_SLOT.offset
+VALID_DEFAULT = _VALID_SLOT.defaultValue.bool
+
+
+def log_header_from_bytes(dat: bytes) -> Tuple[int, bool]:
+  """Reads Event.logMonoTime and Event.valid straight from an unpacked capnp message, only decoding it
+  when the root can't be located directly"""
+  section = root_data_section(dat)
+  if section is None:
+    from cereal.messaging import log_from_bytes  # pylint: disable=import-outside-toplevel
+    msg = log_from_bytes(dat)
+    return msg.logMonoTime, msg.valid
+
+  # logMonoTime is the first word of the data section, fields past its end read as their default
+  start, size = section
+  log_mono_time = struct.unpack_from("<Q", dat, start)[0] if size >= 8 else 0
+  valid = VALID_DEFAULT
+  if VALID_BIT < 8 * size:
+    valid ^= bool(dat[start + VALID_BIT // 8] >> (VALID_BIT % 8) & 1)
+  return log_mono_time, valid
+
+
+def read_stats(name: str) -> np.ndarray:
+  return np.fromfile(stats_path(name), dtype=STATS_DTYPE)
+
+
+def open_stats(name: str, services: List[str], freqs: List[float], latency: bool = True) -> Optional["MessagingStats"]:
+  """MessagingStats for the given services, None when its page can't be created"""
+  try:
+    return MessagingStats(name, services, freqs, latency)
+  except OSError as e:
+    print(f"messaging stats disabled for {name}: {e}")
+    return None
+
+
+class MessagingStats:
+  """Per-service latency, inter-arrival jitter and drop counters of a SubMaster or PubMaster.
+
+  Counters are accumulated in plain lists on every message and copied to a shared memory page
+  every STATS_INTERVAL, see selfdrive/debug/msg_stats.py for a reader."""
+  def __init__(self, name: str, services: List[str], freqs: List[float], latency: bool = True):
+    n = len(services)
+    self.freqs = freqs
+    self.latency = latency
+    self.count = [0] * n
+    self.dropped = [0] * n
+    self.last_time = [0.] * n
+    self.latency_sum = [0.] * n
+    self.latency_max = [0.] * n
+    self.jitter_hist = [[0] * len(JITTER_BINS_MS) for _ in range(n)]
+    self.last_publish = 0.
+    self.count_at_publish = [0] * n
+
+    os.makedirs(STATS_DIR, exist_ok=True)
+    self.page = np.memmap(stats_path(name), dtype=STATS_DTYPE, mode='w+', shape=(n,))
+    self.page['service'] = [s.encode() for s in services]
+    self.page['latency_ms'] = np.nan
+    self.page['max_latency_ms'] = np.nan
+
+  def record(self, i: int, cur_time: float, log_mono_time: Optional[int] = None) -> None:
+    self.count[i] += 1
+
+    if log_mono_time is not None:
+      latency = cur_time - log_mono_time * 1e-9
+      self.latency_sum[i] += latency
+      if latency > self.latency_max[i]:
+        self.latency_max[i] = latency
+
+    last_time, freq = self.last_time[i], self.freqs[i]
+    if last_time > 0. and freq > 1e-5:
+      dt = cur_time - last_time
+      missed = round(dt * freq) - 1
+      if missed > 0:
+        self.dropped[i] += missed
+      self.jitter_hist[i][bisect_left(JITTER_BINS_MS, abs(dt - 1. / freq) * 1e3)] += 1
+    self.last_time[i] = cur_time
+
+  def publish(self, cur_time: float) -> None:
+    if cur_time - self.last_publish < STATS_INTERVAL:
+      return
+    self.last_publish = cur_time
+
+    page = self.page
+    page['count'] = self.count
+    page['dropped'] = self.dropped
+    page['jitter_hist'] = self.jitter_hist
+    if self.latency:
+      n = [max(c - p, 1) for c, p in zip(self.count, self.count_at_publish)]
+      page['latency_ms'] = [1e3 * s / c for s, c in zip(self.latency_sum, n)]
+      page['max_latency_ms'] = [1e3 * m for m in self.latency_max]
+      self.latency_sum = [0.] * len(self.count)
+      self.latency_max = [0.] * len(self.count)
+    self.count_at_publish = list(self.count)
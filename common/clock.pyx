@@ -1,12 +1,15 @@
 # distutils: language = c++
 # cython: language_level = 3
+from cpython.exc cimport PyErr_CheckSignals
+from libc.errno cimport EINTR
 from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC_RAW, clockid_t
+from posix.types cimport time_t
 
 IF UNAME_SYSNAME == "Darwin":
   # Darwin doesn't have a CLOCK_BOOTTIME
   CLOCK_BOOTTIME = CLOCK_MONOTONIC_RAW
 ELSE:
-  from posix.time cimport CLOCK_BOOTTIME
+  from posix.time cimport CLOCK_BOOTTIME, TIMER_ABSTIME, clock_nanosleep
 
 cdef double readclock(clockid_t clock_id):
   cdef timespec ts
@@ -22,3 +25,22 @@ def monotonic_time():
 def sec_since_boot():
   return readclock(CLOCK_BOOTTIME)
 
+IF UNAME_SYSNAME == "Darwin":
+  # Darwin doesn't have clock_nanosleep, fall back to a relative sleep
+  def sleep_until(double t):
+    import time
+    remaining = t - sec_since_boot()
+    if remaining > 0:
+      time.sleep(remaining)
+ELSE:
+  def sleep_until(double t):
+    """Sleeps until sec_since_boot() reaches t. The deadline is absolute, so a late wakeup or
+    an interrupted sleep don't push it back"""
+    cdef timespec ts
+    cdef int ret = EINTR
+    ts.tv_sec = <time_t>t
+    ts.tv_nsec = <long>((t - ts.tv_sec) * 1000000000.)
+    while ret == EINTR:
+      with nogil:
+        ret = clock_nanosleep(CLOCK_BOOTTIME, TIMER_ABSTIME, &ts, NULL)
+      PyErr_CheckSignals()
@@ -1,5 +1,6 @@
-from common.params_pyx import Params, ParamKeyType, UnknownKeyName, put_nonblocking # pylint: disable=no-name-in-module, import-error
+from common.params_pyx import Params, CachedParams, ParamKeyType, UnknownKeyName, put_nonblocking # pylint: disable=no-name-in-module, import-error
 assert Params
+assert CachedParams
 assert ParamKeyType
 assert UnknownKeyName
 assert put_nonblocking
@@ -25,4 +25,5 @@ cdef extern from "selfdrive/common/params.h":
     int put(string, string) nogil
     int putBool(string, bool) nogil
     bool checkKey(string) nogil
+    string getParamsPath() nogil
     void clearAll(ParamKeyType)
@@ -6,8 +6,16 @@ from common.params_pxd cimport Params as c_Params, ParamKeyType as c_ParamKeyTyp
 
 import os
 import threading
+import time
 from common.basedir import BASEDIR
 
+# bumped on every write from this process, lets CachedParams notice local writes immediately
+cdef unsigned long long write_generation = 0
+
+cdef void bump_write_generation():
+  global write_generation
+  write_generation += 1
+
 
 cdef class ParamKeyType:
   PERSISTENT = c_ParamKeyType.PERSISTENT
@@ -49,6 +57,9 @@ cdef class Params:
 
     self.p.clearAll(tx_type)
 
+  def get_params_path(self):
+    return self.p.getParamsPath().decode()
+
   def check_key(self, key):
     key = ensure_bytes(key)
 
@@ -95,16 +106,19 @@ cdef class Params:
     cdef string dat_bytes = ensure_bytes(dat)
     with nogil:
       self.p.put(k, dat_bytes)
+    bump_write_generation()
 
   def put_bool(self, key, bool val):
     cdef string k = self.check_key(key)
     with nogil:
       self.p.putBool(k, val)
+    bump_write_generation()
 
   def delete(self, key):
     cdef string k = self.check_key(key)
     with nogil:
       self.p.remove(k)
+    bump_write_generation()
 
 
 def put_nonblocking(key, val, d=None):
@@ -116,3 +130,61 @@ def put_nonblocking(key, val, d=None):
   t = threading.Thread(target=f, args=(key, val))
   t.start()
   return t
+
+
+class CachedParams:
+  """
+  Process-local read cache on top of Params, for code that reads params every frame.
+
+  Values are served from memory. An entry is revalidated with a single stat() of the
+  param file when this process wrote any param, or once check_interval seconds have
+  passed. Params writes rename a new file over the old one, so a changed inode or
+  mtime means the value was written or deleted by another process (e.g. the UI).
+  """
+  def __init__(self, d=None, check_interval=0.01):
+    self.params = Params(d)
+    self.key_path = os.path.join(self.params.get_params_path(), "d")
+    self.check_interval = check_interval
+    self.cache = {}
+
+  def _file_signature(self, key):
+    try:
+      st = os.stat(os.path.join(self.key_path, key))
+    except FileNotFoundError:
+      return None
+    return st.st_ino, st.st_mtime_ns
+
+  def _get_raw(self, key):
+    if isinstance(key, bytes):
+      key = key.decode()
+
+    now = time.monotonic()
+    entry = self.cache.get(key)
+    if entry is not None:
+      sig, val, checked, generation = entry
+      if generation == write_generation and now - checked < self.check_interval:
+        return val
+      if self._file_signature(key) == sig:
+        self.cache[key] = (sig, val, now, write_generation)
+        return val
+
+    self.params.check_key(key)
+    sig = self._file_signature(key)
+    val = self.params.get(key)
+    self.cache[key] = (sig, val, now, write_generation)
+    return val
+
+  def get(self, key, encoding=None):
+    val = self._get_raw(key)
+    if val is not None and encoding is not None:
+      return val.decode(encoding)
+    return val
+
+  def get_bool(self, key):
+    return self._get_raw(key) == b"1"
+
+  def invalidate(self, key=None):
+    if key is None:
+      self.cache.clear()
+    else:
+      self.cache.pop(ensure_bytes(key).decode(), None)
@@ -1,5 +1,7 @@
 import time
 
+import numpy as np
+
 class Profiler():
   def __init__(self, enabled=False):
     self.enabled = enabled
@@ -43,3 +45,61 @@ class Profiler():
       else:
         print("%30s: %9.2f  avg: %7.2f  percent: %3.0f" % (n, ms*1000.0, ms*1000.0/self.iter, ms/self.tot*100))
     print("Iter clock: %2.6f   TOTAL: %2.2f" % (self.tot/self.iter, self.tot))
+
+
+class HistogramProfiler():
+  """Low overhead profiler that can stay enabled in realtime loops.
+
+  checkpoint() only stores the time spent since the previous checkpoint, report() turns the samples
+  collected since the last report into fixed bucket histograms and p50/p99/max per checkpoint."""
+  BUCKET_EDGES_US = [50., 100., 200., 500., 1000., 2000., 5000., 10000., 20000., float('inf')]
+
+  def __init__(self):
+    self.samples = {}
+    self.steps = 0
+    self.last_time = time.perf_counter_ns()
+
+  def checkpoint(self, name, ignore=False):
+    # ignore flag needed when benchmarking threads with ratekeeper
+    t = time.perf_counter_ns()
+    if not ignore:
+      self.record(name, t - self.last_time)
+    self.last_time = t
+
+  def record(self, name, duration_ns):
+    """Adds a duration measured elsewhere"""
+    samples = self.samples.get(name)
+    if samples is None:
+      samples = self.samples[name] = []
+    samples.append(duration_ns)
+
+  def step(self):
+    self.steps += 1
+
+  def report(self):
+    """Returns (steps, [(name, p50_us, p99_us, max_us, histogram)]) since the last report and starts a new one"""
+    edges = np.array([0.] + self.BUCKET_EDGES_US)
+    ret = []
+    for name, samples in self.samples.items():
+      if not len(samples):
+        continue
+      us = np.array(samples, dtype=np.float64) * 1e-3
+      p50, p99 = np.percentile(us, [50, 99])
+      ret.append((name, float(p50), float(p99), float(us.max()), np.histogram(us, bins=edges)[0].tolist()))
+      samples.clear()
+
+    steps, self.steps = self.steps, 0
+    return steps, ret
+
+  def fill_stats(self, stats):
+    """Fills a cereal ProfileStats struct with a report"""
+    steps, checkpoints = self.report()
+    stats.steps = steps
+    stats.bucketEdgesUs = self.BUCKET_EDGES_US
+    cps = stats.init('checkpoints', len(checkpoints))
+    for cp, (name, p50, p99, max_us, histogram) in zip(cps, checkpoints):
+      cp.name = name
+      cp.p50Us = p50
+      cp.p99Us = p99
+      cp.maxUs = max_us
+      cp.histogram = histogram
@@ -1,11 +1,10 @@
 """Utilities for reading real time clocks and keeping soft real time constraints."""
 import gc
 import os
-import time
 import multiprocessing
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from common.clock import sec_since_boot  # pylint: disable=no-name-in-module, import-error
+from common.clock import sec_since_boot, sleep_until  # pylint: disable=no-name-in-module, import-error
 from selfdrive.hardware import PC, TICI
 
 
@@ -48,16 +47,35 @@ def config_realtime_process(core: int, priority: int) -> None:
   set_core_affinity(core)
 
 
+class LagStats(NamedTuple):
+  frames: int  # frames in the window
+  missed: int  # missed deadlines since start
+  # lag behind the deadline at the end of a frame in seconds over the window, negative means time to spare
+  p50: float
+  p99: float
+  max: float
+
+
 class Ratekeeper:
-  def __init__(self, rate: int, print_delay_threshold: Optional[float] = 0.0) -> None:
-    """Rate in Hz for ratekeeping. print_delay_threshold must be nonnegative."""
+  def __init__(self, rate: float, print_delay_threshold: Optional[float] = 0.0, spin_time: float = 0.0,
+               stats_window: Optional[int] = None) -> None:
+    """Rate in Hz for ratekeeping. print_delay_threshold must be nonnegative.
+    keep_time sleeps until spin_time seconds before the deadline and busy waits for the rest, trading cpu time for
+    less wakeup jitter. Lag stats are kept over the last stats_window frames, one second by default."""
     self._interval = 1. / rate
     self._next_frame_time = sec_since_boot() + self._interval
+    self._deadline = self._next_frame_time
     self._print_delay_threshold = print_delay_threshold
+    self._spin_time = spin_time
     self._frame = 0
     self._remaining = 0.0
     self._process_name = multiprocessing.current_process().name
 
+    self._missed = 0
+    self._lags = [0.] * (stats_window or max(int(rate), 1))
+    self._lags_pos = 0
+    self._lags_count = 0
+
   @property
   def frame(self) -> int:
     return self._frame
@@ -70,17 +88,46 @@ class Ratekeeper:
   def keep_time(self) -> bool:
     lagged = self.monitor_time()
     if self._remaining > 0:
-      time.sleep(self._remaining)
+      # sleep to the absolute deadline, time spent since monitor_time doesn't add up
+      if self._spin_time > 0:
+        sleep_until(self._deadline - self._spin_time)
+        while sec_since_boot() < self._deadline:
+          pass
+      else:
+        sleep_until(self._deadline)
     return lagged
 
   # this only monitor the cumulative lag, but does not enforce a rate
   def monitor_time(self) -> bool:
     lagged = False
-    remaining = self._next_frame_time - sec_since_boot()
+    self._deadline = self._next_frame_time
+    remaining = self._deadline - sec_since_boot()
     self._next_frame_time += self._interval
     if self._print_delay_threshold is not None and remaining < -self._print_delay_threshold:
       print("%s lagging by %.2f ms" % (self._process_name, -remaining * 1000))
       lagged = True
     self._frame += 1
     self._remaining = remaining
+
+    if remaining < 0:
+      self._missed += 1
+    self._lags[self._lags_pos] = -remaining
+    self._lags_pos = (self._lags_pos + 1) % len(self._lags)
+    self._lags_count = min(self._lags_count + 1, len(self._lags))
     return lagged
+
+  def lag_stats(self) -> LagStats:
+    n = self._lags_count
+    if n == 0:
+      return LagStats(0, self._missed, 0., 0., 0.)
+    lags = sorted(self._lags[:n] if n < len(self._lags) else self._lags)
+    return LagStats(n, self._missed, lags[(n - 1) // 2], lags[int(0.99 * (n - 1))], lags[-1])
+
+  def fill_stats(self, stats) -> None:
+    """Fills a cereal RatekeeperStats struct"""
+    lag = self.lag_stats()
+    stats.frames = lag.frames
+    stats.missedDeadlines = lag.missed
+    stats.lagP50Ms = lag.p50 * 1000.
+    stats.lagP99Ms = lag.p99 * 1000.
+    stats.lagMaxMs = lag.max * 1000.
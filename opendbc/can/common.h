@@ -47,6 +47,35 @@ public:
   bool update_counter_generic(int64_t v, int cnt_size);
 };
 
+// CAN frame with its payload zero-padded to 8 bytes
+struct CanFrame {
+  uint32_t address;
+  uint16_t busTime;
+  uint8_t dat[8];
+};
+
+// all frames of one `can`/`sendcan` event, grouped by source bus
+struct CanFrameEvent {
+  uint64_t sec;
+  std::map<uint8_t, std::vector<CanFrame>> bus_frames;
+};
+
+// deserializes a batch of events once so several parsers can share the result
+class CANDecoder {
+private:
+  kj::Array<capnp::word> aligned_buf;
+  size_t num_events = 0;
+  std::vector<CanFrameEvent> frame_events;
+
+public:
+  CANDecoder();
+  #ifndef DYNAMIC_CAPNP
+  void update_strings(const std::vector<std::string> &data, bool sendcan);
+  #endif
+  const std::vector<CanFrameEvent>& events() const { return frame_events; }
+  size_t size() const { return num_events; }
+};
+
 class CANParser {
 private:
   const int bus;
@@ -68,6 +97,7 @@ public:
   void UpdateCans(uint64_t sec, const capnp::List<cereal::CanData>::Reader& cans);
   #endif
   void UpdateCans(uint64_t sec, const capnp::DynamicStruct::Reader& cans);
+  void UpdateFrames(const CanFrameEvent &event);
   void UpdateValid(uint64_t sec);
   std::vector<SignalValue> query_latest();
 };
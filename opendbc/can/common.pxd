@@ -73,10 +73,20 @@ cdef extern from "common_dbc.h":
 cdef extern from "common.h":
   cdef const DBC* dbc_lookup(const string);
 
+  cdef cppclass CanFrameEvent:
+    uint64_t sec
+
+  cdef cppclass CANDecoder:
+    CANDecoder()
+    void update_strings(vector[string], bool)
+    const vector[CanFrameEvent]& events()
+    size_t size()
+
   cdef cppclass CANParser:
     bool can_valid
     CANParser(int, string, vector[MessageParseOptions], vector[SignalParseOptions])
     void update_string(string, bool)
+    void UpdateFrames(const CanFrameEvent&)
     vector[SignalValue] query_latest()
 
   cdef cppclass CANPacker:
@@ -1,10 +1,15 @@
 import re
 import os
+import marshal
 import struct
 import sys
+import hashlib
 import numbers
+import tempfile
 from collections import namedtuple, defaultdict
 
+import numpy as np
+
 def int_or_float(s):
   # return number, trying to maintain int format
   if s.isdigit():
@@ -17,14 +22,91 @@ DBCSignal = namedtuple(
   "DBCSignal", ["name", "start_bit", "size", "is_little_endian", "is_signed",
                 "factor", "offset", "tmin", "tmax", "units"])
 
+# bit layout of a signal within the big or little endian 64-bit view of the data
+SignalLayout = namedtuple(
+  "SignalLayout", ["name", "is_little_endian", "is_signed", "shift", "mask", "size",
+                   "factor", "offset"])
+
+
+# parsed DBCs are cached here, keyed on the DBC name and validated by content hash.
+# the tables are stored with marshal, which only holds plain data, and only cache files
+# owned by the current user that nobody else can write are read.
+# bump DBC_CACHE_VERSION whenever the layout of the parsed tables changes
+DBC_CACHE_DIR = os.getenv("DBC_CACHE_DIR", os.path.join(tempfile.gettempdir(), f"dbc_cache_{os.getuid()}"))
+DBC_CACHE_VERSION = 2
+DBC_CACHE_MAGIC = b"DBCC"
+DBC_CACHE_HEADER = struct.Struct("<4sI32s")
+
 
 class dbc():
   def __init__(self, fn):
     self.name, _ = os.path.splitext(os.path.basename(fn))
-    with open(fn, encoding="ascii") as f:
-      self.txt = f.readlines()
+    with open(fn, "rb") as f:
+      raw = f.read()
+    self.txt = raw.decode("ascii").splitlines(keepends=True)
     self._warned_addresses = set()
+    self._layouts = {}
+
+    # lookup to bit reverse each byte
+    self.bits_index = [(i & ~0b111) + ((-i - 1) & 0b111) for i in range(64)]
+
+    dbc_hash = hashlib.sha256(raw).digest()
+    cache_fn = os.path.join(DBC_CACHE_DIR, self.name + ".cache")
 
+    tables = self._load_cache(cache_fn, dbc_hash)
+    if tables is None:
+      tables = self._parse()
+      self._save_cache(cache_fn, dbc_hash, tables)
+    self.msgs, self.def_vals = tables
+
+    self.msg_name_to_address = {}
+    for address, m in self.msgs.items():
+      name = m[0][0]
+      self.msg_name_to_address[name] = address
+
+  @staticmethod
+  def _load_cache(cache_fn, dbc_hash):
+    try:
+      with open(cache_fn, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_uid != os.getuid() or st.st_mode & 0o022:
+          print("ignoring dbc cache {0}, not owned by this user or writable by others".format(cache_fn))
+          return None
+        dat = f.read()
+    except FileNotFoundError:
+      return None
+    except OSError as e:
+      print("failed to read dbc cache {0}: {1}".format(cache_fn, e))
+      return None
+
+    try:
+      magic, version, cached_hash = DBC_CACHE_HEADER.unpack_from(dat)
+      if magic != DBC_CACHE_MAGIC or version != DBC_CACHE_VERSION or cached_hash != dbc_hash:
+        # stale cache, reparse
+        return None
+      msgs, def_vals = marshal.loads(dat[DBC_CACHE_HEADER.size:])
+      msgs = {address: ((name, size), [DBCSignal(*sig) for sig in sigs]) for address, ((name, size), sigs) in msgs.items()}
+      return msgs, defaultdict(list, def_vals)
+    except (struct.error, EOFError, ValueError, TypeError, AttributeError) as e:
+      print("corrupt dbc cache {0}: {1}".format(cache_fn, e))
+      return None
+
+  @staticmethod
+  def _save_cache(cache_fn, dbc_hash, tables):
+    msgs, def_vals = tables
+    # signals as plain tuples, marshal doesn't support namedtuples
+    msgs = {address: (hdr, [tuple(sig) for sig in sigs]) for address, (hdr, sigs) in msgs.items()}
+    try:
+      os.makedirs(DBC_CACHE_DIR, mode=0o700, exist_ok=True)
+      fd, tmp_fn = tempfile.mkstemp(dir=DBC_CACHE_DIR)
+      with os.fdopen(fd, "wb") as f:
+        f.write(DBC_CACHE_HEADER.pack(DBC_CACHE_MAGIC, DBC_CACHE_VERSION, dbc_hash))
+        f.write(marshal.dumps((msgs, dict(def_vals))))
+      os.replace(tmp_fn, cache_fn)
+    except OSError as e:
+      print("failed to write dbc cache {0}: {1}".format(cache_fn, e))
+
+  def _parse(self):
     # regexps from https://github.com/ebroecker/canmatrix/blob/master/canmatrix/importdbc.py
     bo_regexp = re.compile(r"^BO\_ (\w+) (\w+) *: (\w+) (\w+)")
     sg_regexp = re.compile(r"^SG\_ (\w+) : (\d+)\|(\d+)@(\d+)([\+|\-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[([0-9.+\-eE]+)\|([0-9.+\-eE]+)\] \"(.*)\" (.*)")
@@ -36,13 +118,10 @@ class dbc():
     #   size is the size of the message in bytes.
     #   signals is a list signals contained in the message.
     # signals is a list of DBCSignal in order of increasing start_bit.
-    self.msgs = {}
+    msgs = {}
 
     # A dictionary which maps message ids to a list of tuples (signal name, definition value pairs)
-    self.def_vals = defaultdict(list)
-
-    # lookup to bit reverse each byte
-    self.bits_index = [(i & ~0b111) + ((-i - 1) & 0b111) for i in range(64)]
+    def_vals = defaultdict(list)
 
     for l in self.txt:
       l = l.strip()
@@ -57,10 +136,10 @@ class dbc():
         name = dat.group(2)
         size = int(dat.group(3))
         ids = int(dat.group(1), 0)  # could be hex
-        if ids in self.msgs:
+        if ids in msgs:
           sys.exit("Duplicate address detected %d %s" % (ids, self.name))
 
-        self.msgs[ids] = ((name, size), [])
+        msgs[ids] = ((name, size), [])
 
       if l.startswith("SG_ "):
         # new signal
@@ -84,7 +163,7 @@ class dbc():
         tmax = int_or_float(dat.group(go + 9))
         units = dat.group(go + 10)
 
-        self.msgs[ids][1].append(
+        msgs[ids][1].append(
           DBCSignal(sgname, start_bit, signal_size, is_little_endian,
                     is_signed, factor, offset, tmin, tmax, units))
 
@@ -106,15 +185,12 @@ class dbc():
         defvals[1::2] = [d.strip().upper().replace(" ", "_") for d in defvals[1::2]]
         defvals = '"' + "".join(str(i) for i in defvals) + '"'
 
-        self.def_vals[ids].append((sgname, defvals))
+        def_vals[ids].append((sgname, defvals))
 
-    for msg in self.msgs.values():
+    for msg in msgs.values():
       msg[1].sort(key=lambda x: x.start_bit)
 
-    self.msg_name_to_address = {}
-    for address, m in self.msgs.items():
-      name = m[0][0]
-      self.msg_name_to_address[name] = address
+    return msgs, def_vals
 
   def lookup_msg_id(self, msg_id):
     if not isinstance(msg_id, numbers.Number):
@@ -255,6 +331,118 @@ class dbc():
     msg = self.lookup_msg_id(msg)
     return [sgs.name for sgs in self.msgs[msg][1]]
 
+  def get_layout(self, msg_id):
+    """Per-signal bit layout of a message, precomputed once for the batch APIs.
+
+       Returns a list of SignalLayout, one per signal that fits in 64 bits.
+    """
+    msg_id = self.lookup_msg_id(msg_id)
+    layout = self._layouts.get(msg_id)
+    if layout is None:
+      layout = []
+      for s in self.msgs[msg_id][1]:
+        if s.is_little_endian:
+          shift = s.start_bit
+        else:
+          b1 = (s.start_bit // 8) * 8 + (-s.start_bit - 1) % 8
+          shift = 64 - (b1 + s.size)
+        if shift < 0:
+          continue
+        layout.append(SignalLayout(s.name, s.is_little_endian, s.is_signed, np.uint64(shift),
+                                   np.uint64((1 << s.size) - 1), s.size, s.factor, s.offset))
+      self._layouts[msg_id] = layout
+    return layout
+
+  def encode_many(self, msg_id, dd):
+    """Encode many CAN messages with the same ID at once.
+
+       Inputs:
+        msg_id: The message ID.
+        dd: A dictionary mapping signal name to an array of signal values,
+            all arrays must have the same length.
+
+       Returns an (n, size) uint8 array with one encoded message per row.
+    """
+    msg_id = self.lookup_msg_id(msg_id)
+    size = self.msgs[msg_id][0][1]
+
+    n = len(next(iter(dd.values()))) if len(dd) else 0
+    result = np.zeros(n, dtype=np.uint64)
+    for s in self.get_layout(msg_id):
+      vals = dd.get(s.name)
+      if vals is None:
+        continue
+
+      # same rounding and offset handling as encode()
+      ival = np.round(np.asarray(vals, dtype=np.float64) / s.factor - s.offset).astype(np.int64)
+      dat = (ival.view(np.uint64) & s.mask) << s.shift
+      mask = np.uint64(s.mask << s.shift)
+
+      # little endian signals are built in little endian space, move them to big endian
+      if s.is_little_endian:
+        dat = dat.byteswap()
+        mask = mask.byteswap()
+
+      result &= ~mask
+      result |= dat
+
+    return result.astype('>u8').view(np.uint8).reshape(n, 8)[:, :size]
+
+  def decode_many(self, addresses, data, arr=None):
+    """Decode many CAN messages at once into columnar arrays.
+
+       Inputs:
+        addresses: An array of CAN addresses.
+        data: The CAN data of each frame, either a list of bytes or an
+              (n, 8) uint8 array of zero-padded data.
+        arr: Optional list of signals which should be decoded and returned.
+
+       Returns:
+        A dict mapping message name to a tuple (idx, signals), where idx are
+        the positions of that message in the input and signals is a dict of
+        signal name to a float64 array of decoded values. Frames with unknown
+        addresses are skipped.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint32)
+    if isinstance(data, np.ndarray):
+      dat = np.ascontiguousarray(data, dtype=np.uint8).reshape(-1, 8)
+    else:
+      dat = np.frombuffer(b"".join(d.ljust(8, b'\x00') for d in data), dtype=np.uint8).reshape(-1, 8)
+
+    be = dat.view('>u8').ravel().astype(np.uint64)
+    le = dat.view('<u8').ravel().astype(np.uint64)
+
+    # group frames by address with a single sort
+    order = np.argsort(addresses, kind='stable')
+    uniq, starts = np.unique(addresses[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+
+    out = {}
+    for address, start, end in zip(uniq.tolist(), starts, ends):
+      msg = self.msgs.get(address)
+      if msg is None:
+        self._warned_addresses.add(address)
+        continue
+
+      idx = order[start:end]
+      msg_be, msg_le = be[idx], le[idx]
+
+      sigs = {}
+      for s in self.get_layout(address):
+        if arr is not None and s.name not in arr:
+          continue
+
+        tmp = ((msg_le if s.is_little_endian else msg_be) >> s.shift) & s.mask
+        if s.is_signed:
+          tmp = tmp.view(np.int64)
+          if s.size < 64:
+            tmp = np.where(tmp >> (s.size - 1), tmp - (1 << s.size), tmp)
+
+        sigs[s.name] = tmp.astype(np.float64) * s.factor + s.offset
+      out[msg[0][0]] = (idx, sigs)
+
+    return out
+
 
 if __name__ == "__main__":
    from opendbc import DBC_PATH
@@ -243,6 +243,24 @@ void CANParser::UpdateCans(uint64_t sec, const capnp::List<cereal::CanData>::Rea
 }
 #endif
 
+void CANParser::UpdateFrames(const CanFrameEvent &event) {
+  last_sec = event.sec;
+
+  auto bus_it = event.bus_frames.find(bus);
+  if (bus_it != event.bus_frames.end()) {
+    for (const auto &frame : bus_it->second) {
+      auto state_it = message_states.find(frame.address);
+      if (state_it == message_states.end()) continue;
+
+      uint8_t dat[8];
+      memcpy(dat, frame.dat, sizeof(dat));
+      state_it->second.parse(last_sec, frame.busTime, dat);
+    }
+  }
+
+  UpdateValid(last_sec);
+}
+
 void CANParser::UpdateCans(uint64_t sec, const capnp::DynamicStruct::Reader& cmsg) {
   // assume message struct is `cereal::CanData` and parse
   assert(cmsg.has("address") && cmsg.has("src") && cmsg.has("dat") && cmsg.has("busTime"));
@@ -280,6 +298,51 @@ void CANParser::UpdateValid(uint64_t sec) {
   }
 }
 
+CANDecoder::CANDecoder() : aligned_buf(kj::heapArray<capnp::word>(1024)) {}
+
+#ifndef DYNAMIC_CAPNP
+void CANDecoder::update_strings(const std::vector<std::string> &data, bool sendcan) {
+  // event and per-bus vectors are reused between batches to keep their capacity
+  if (frame_events.size() < data.size()) {
+    frame_events.resize(data.size());
+  }
+  num_events = data.size();
+
+  for (size_t i = 0; i < num_events; i++) {
+    const std::string &s = data[i];
+
+    // format for board, make copy due to alignment issues.
+    const size_t buf_size = (s.length() / sizeof(capnp::word)) + 1;
+    if (aligned_buf.size() < buf_size) {
+      aligned_buf = kj::heapArray<capnp::word>(buf_size);
+    }
+    memcpy(aligned_buf.begin(), s.data(), s.length());
+
+    capnp::FlatArrayMessageReader cmsg(aligned_buf.slice(0, buf_size));
+    cereal::Event::Reader event = cmsg.getRoot<cereal::Event>();
+
+    CanFrameEvent &frame_event = frame_events[i];
+    frame_event.sec = event.getLogMonoTime();
+    for (auto &kv : frame_event.bus_frames) {
+      kv.second.clear();
+    }
+
+    auto cans = sendcan? event.getSendcan() : event.getCan();
+    for (const auto cdat : cans) {
+      if (cdat.getDat().size() > 8) continue; //shouldn't ever happen
+
+      CanFrame frame = {
+        .address = cdat.getAddress(),
+        .busTime = cdat.getBusTime(),
+        .dat = {0},
+      };
+      memcpy(frame.dat, cdat.getDat().begin(), cdat.getDat().size());
+      frame_event.bus_frames[cdat.getSrc()].push_back(frame);
+    }
+  }
+}
+#endif
+
 std::vector<SignalValue> CANParser::query_latest() {
   std::vector<SignalValue> ret;
 
@@ -9,6 +9,8 @@ from libcpp.map cimport map
 from libcpp cimport bool
 
 from .common cimport CANParser as cpp_CANParser
+from .common cimport CANDecoder as cpp_CANDecoder
+from .common cimport CanFrameEvent
 from .common cimport SignalParseOptions, MessageParseOptions, dbc_lookup, SignalValue, DBC
 
 import os
@@ -144,6 +146,48 @@ cdef class CANParser:
 
     return updated_vals
 
+  cdef set update_frames(self, cpp_CANDecoder *decoder):
+    updated_vals = set()
+
+    cdef size_t i
+    for i in range(decoder.size()):
+      self.can.UpdateFrames(decoder.events()[i])
+      updated_vals.update(self.update_vl())
+
+    return updated_vals
+
+
+cdef class CANDecoder:
+  """Deserializes each batch of can strings once and feeds every attached parser"""
+  cdef:
+    cpp_CANDecoder *decoder
+
+  cdef readonly:
+    list parsers
+
+  def __init__(self, parsers=None):
+    self.decoder = new cpp_CANDecoder()
+    self.parsers = []
+    for p in (parsers or []):
+      self.attach(p)
+
+  def __dealloc__(self):
+    del self.decoder
+
+  def attach(self, CANParser parser):
+    if parser is not None and parser not in self.parsers:
+      self.parsers.append(parser)
+
+  def update_strings(self, strings, sendcan=False):
+    self.decoder.update_strings(strings, sendcan)
+
+    # updated addresses for each parser, in attach order
+    cdef CANParser p
+    updated = []
+    for p in self.parsers:
+      updated.append(p.update_frames(self.decoder))
+    return updated
+
 cdef class CANDefine():
   cdef:
     const DBC *dbc
@@ -8,6 +8,8 @@ import os
 import time
 import traceback
 import sys
+import threading
+import numpy as np
 from .dfu import PandaDFU, MCU_TYPE_F2, MCU_TYPE_F4, MCU_TYPE_H7  # pylint: disable=import-error
 from .flash_release import flash_release  # noqa pylint: disable=import-error
 from .update import ensure_st_up_to_date  # noqa pylint: disable=import-error
@@ -21,22 +23,34 @@ BASEDIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../")
 
 DEBUG = os.getenv("PANDADEBUG") is not None
 
+# each CAN frame in a bulk USB read is 16 bytes: two little endian u32 headers and 8 data bytes
+CAN_FRAME = struct.Struct("<II8s")
+CAN_FRAME_DTYPE = np.dtype([('f1', '<u4'), ('f2', '<u4'), ('dat', 'u1', (8,))])
+
 def parse_can_buffer(dat):
   ret = []
-  for j in range(0, len(dat), 0x10):
-    ddat = dat[j:j + 0x10]
-    f1, f2 = struct.unpack("II", ddat[0:8])
-    extended = 4
-    if f1 & extended:
+  mv = memoryview(dat)
+  for f1, f2, ddat in CAN_FRAME.iter_unpack(mv[:len(mv) - len(mv) % CAN_FRAME.size]):
+    if f1 & 4:
       address = f1 >> 3
     else:
       address = f1 >> 21
-    dddat = ddat[8:8 + (f2 & 0xF)]
+    dddat = ddat[:f2 & 0xF]
     if DEBUG:
       print(f"  R 0x{address:x}: 0x{dddat.hex()}")
     ret.append((address, f2 >> 16, dddat, (f2 >> 4) & 0xFF))
   return ret
 
+def parse_can_buffer_columns(dat):
+  """Columnar version of parse_can_buffer, the buffer is viewed in place without a copy per frame.
+
+  Returns (address, busTime, dat, length, src) arrays, dat has shape (n, 8) and only the
+  first length bytes of each row are valid."""
+  frames = np.frombuffer(dat, dtype=CAN_FRAME_DTYPE, count=len(dat) // CAN_FRAME_DTYPE.itemsize)
+  f1, f2 = frames['f1'], frames['f2']
+  address = np.where(f1 & 4, f1 >> 3, f1 >> 21)
+  return address, f2 >> 16, frames['dat'], f2 & 0xF, (f2 >> 4) & 0xFF
+
 class PandaWifiStreaming(object):
   def __init__(self, ip="192.168.0.10", port=1338):
     self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -154,6 +168,9 @@ class Panda(object):
   def __init__(self, serial=None, claim=True):
     self._serial = serial
     self._handle = None
+    self._can_tx_buf = bytearray(self.CAN_TX_BUF_SIZE)
+    self._can_tx_len = 0
+    self._can_tx_lock = threading.Lock()  # tx buffer is shared with can_recv, which may run in a receive thread
     self.connect(claim)
     self._mcu_type = self.get_mcu_type()
 
@@ -164,6 +181,7 @@ class Panda(object):
   def connect(self, claim=True, wait=False):
     if self._handle is not None:
       self.close()
+    self._can_tx_len = 0
 
     if self._serial == "WIFI":
       self._handle = WifiHandle()
@@ -503,10 +521,19 @@ class Panda(object):
   # Timeout is in ms. If set to 0, the timeout is infinite.
   CAN_SEND_TIMEOUT_MS = 10
 
-  def can_send_many(self, arr, timeout=CAN_SEND_TIMEOUT_MS):
-    snds = []
+  # Frames are packed in place into a preallocated buffer. Frames queued with flush=False are
+  # only written once the buffer is full, on can_flush or on can_recv, there is no timer.
+  # Callers that need frames on the bus at a given time must flush them.
+  CAN_TX_BUF_SIZE = 0x10 * 256
+
+  def can_send_many(self, arr, timeout=CAN_SEND_TIMEOUT_MS, flush=True):
+    with self._can_tx_lock:
+      self._can_send_many(arr, timeout, flush)
+
+  def _can_send_many(self, arr, timeout, flush):
     transmit = 1
     extended = 4
+    buf = self._can_tx_buf
     for addr, _, dat, bus in arr:
       assert len(dat) <= 8
       if DEBUG:
@@ -515,25 +542,45 @@ class Panda(object):
         rir = (addr << 3) | transmit | extended
       else:
         rir = (addr << 21) | transmit
-      snd = struct.pack("II", rir, len(dat) | (bus << 4)) + dat
-      snd = snd.ljust(0x10, b'\x00')
-      snds.append(snd)
 
+      CAN_FRAME.pack_into(buf, self._can_tx_len, rir, len(dat) | (bus << 4), dat)
+      self._can_tx_len += CAN_FRAME.size
+      if self._can_tx_len == len(buf):
+        self._can_flush(timeout)
+
+    if flush:
+      self._can_flush(timeout)
+
+  def can_flush(self, timeout=CAN_SEND_TIMEOUT_MS):
+    """Writes all frames queued by can_send_many"""
+    with self._can_tx_lock:
+      self._can_flush(timeout)
+
+  def _can_flush(self, timeout):
+    if self._can_tx_len == 0:
+      return
+
+    snd = memoryview(self._can_tx_buf)[:self._can_tx_len]
     while True:
       try:
         if self.wifi:
-          for s in snds:
-            self._handle.bulkWrite(3, s)
+          for j in range(0, len(snd), CAN_FRAME.size):
+            self._handle.bulkWrite(3, bytes(snd[j:j + CAN_FRAME.size]))
         else:
-          self._handle.bulkWrite(3, b''.join(snds), timeout=timeout)
+          self._handle.bulkWrite(3, snd, timeout=timeout)
         break
       except (usb1.USBErrorIO, usb1.USBErrorOverflow):
         print("CAN: BAD SEND MANY, RETRYING")
+    snd.release()
+    self._can_tx_len = 0
 
-  def can_send(self, addr, dat, bus, timeout=CAN_SEND_TIMEOUT_MS):
-    self.can_send_many([[addr, None, dat, bus]], timeout=timeout)
+  def can_send(self, addr, dat, bus, timeout=CAN_SEND_TIMEOUT_MS, flush=True):
+    self.can_send_many([[addr, None, dat, bus]], timeout=timeout, flush=flush)
+
+  def _can_recv_raw(self):
+    # responses to queued frames can't arrive before they're sent
+    self.can_flush()
 
-  def can_recv(self):
     dat = bytearray()
     while True:
       try:
@@ -542,7 +589,13 @@ class Panda(object):
       except (usb1.USBErrorIO, usb1.USBErrorOverflow):
         print("CAN: BAD RECV, RETRYING")
         time.sleep(0.1)
-    return parse_can_buffer(dat)
+    return dat
+
+  def can_recv(self):
+    return parse_can_buffer(self._can_recv_raw())
+
+  def can_recv_columns(self):
+    return parse_can_buffer_columns(self._can_recv_raw())
 
   def can_clear(self, bus):
     """Clears all messages from the specified internal CAN ringbuffer as
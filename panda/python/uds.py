@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import time
 import struct
+import threading
 from collections import deque
+from functools import partial
 from typing import Callable, NamedTuple, Tuple, List, Deque, Generator, Optional, cast
 from enum import IntEnum
 
@@ -270,10 +272,54 @@ _negative_response_codes = {
 }
 
 
+class CanReceiver():
+  """Polls a CAN source from one thread and hands the frames to every attached CanClient.
+
+  Clients attached to a receiver block in wait() until frames arrive instead of polling,
+  so any number of concurrent ISO-TP sessions share a single receive loop."""
+  def __init__(self, can_recv: Callable[[], List[Tuple[int, int, bytes, int]]], poll_interval: float = 0.001):
+    self.rx = can_recv
+    self.poll_interval = poll_interval
+    self.clients = []  # type: List[CanClient]
+    self.cv = threading.Condition()
+    self._exit_event = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  def start(self) -> None:
+    self._thread.start()
+
+  def stop(self) -> None:
+    self._exit_event.set()
+    self._thread.join()
+
+  def attach(self, client: 'CanClient') -> None:
+    with self.cv:
+      self.clients.append(client)
+
+  def detach(self, client: 'CanClient') -> None:
+    with self.cv:
+      self.clients.remove(client)
+      client.rx_buff.clear()
+
+  def _run(self) -> None:
+    while not self._exit_event.is_set():
+      msgs = self.rx()
+      if msgs:
+        with self.cv:
+          for client in self.clients:
+            client._buffer_msgs(msgs)
+          self.cv.notify_all()
+      # only back off when the source is empty, a non-full read means there is nothing left
+      if len(msgs or []) < 254:
+        self._exit_event.wait(self.poll_interval)
+
+
 class CanClient():
   def __init__(self, can_send: Callable[[int, bytes, int], None], can_recv: Callable[[], List[Tuple[int, int, bytes, int]]],
-               tx_addr: int, rx_addr: int, bus: int, sub_addr: int = None, debug: bool = False):
+               tx_addr: int, rx_addr: int, bus: int, sub_addr: int = None, debug: bool = False,
+               receiver: CanReceiver = None, poll_interval: float = 0.001, can_flush: Callable[[], None] = None):
     self.tx = can_send
+    self.flush = can_flush  # writes frames queued by can_send, None if can_send writes right away
     self.rx = can_recv
     self.tx_addr = tx_addr
     self.rx_addr = rx_addr
@@ -281,6 +327,18 @@ class CanClient():
     self.sub_addr = sub_addr
     self.bus = bus
     self.debug = debug
+    self.receiver = receiver
+    self.poll_interval = poll_interval
+    self._rx_empty = False
+    self._attached = receiver is not None
+    if receiver is not None:
+      receiver.attach(self)
+
+  def close(self) -> None:
+    """Detaches from the receiver, a client that's attached keeps buffering every received frame"""
+    if self._attached:
+      self.receiver.detach(self)
+      self._attached = False
 
   def _recv_filter(self, bus: int, addr: int) -> bool:
     # handle functional addresses (switch to first addr to respond)
@@ -301,30 +359,51 @@ class CanClient():
         self.rx_addr = addr
     return bus == self.bus and addr == self.rx_addr
 
+  def _buffer_msgs(self, msgs: List[Tuple[int, int, bytes, int]]) -> None:
+    for rx_addr, _, rx_data, rx_bus in msgs:
+      if self._recv_filter(rx_bus, rx_addr) and len(rx_data) > 0:
+        rx_data = bytes(rx_data)  # convert bytearray to bytes
+
+        if self.debug:
+          print(f"CAN-RX: {hex(rx_addr)} - 0x{bytes.hex(rx_data)}")
+
+        # Cut off sub addr in first byte
+        if self.sub_addr is not None:
+          rx_data = rx_data[1:]
+
+        self.rx_buff.append(rx_data)
+
   def _recv_buffer(self, drain: bool = False) -> None:
+    if self.receiver is not None:
+      # frames are buffered by the receive thread
+      if drain:
+        with self.receiver.cv:
+          self.rx_buff.clear()
+      return
+
     while True:
       msgs = self.rx()
+      self._rx_empty = not msgs
       if drain:
         if self.debug:
           print("CAN-RX: drain - {}".format(len(msgs)))
         self.rx_buff.clear()
       else:
-        for rx_addr, _, rx_data, rx_bus in msgs or []:
-          if self._recv_filter(rx_bus, rx_addr) and len(rx_data) > 0:
-            rx_data = bytes(rx_data)  # convert bytearray to bytes
-
-            if self.debug:
-              print(f"CAN-RX: {hex(rx_addr)} - 0x{bytes.hex(rx_data)}")
-
-            # Cut off sub addr in first byte
-            if self.sub_addr is not None:
-              rx_data = rx_data[1:]
-
-            self.rx_buff.append(rx_data)
+        self._buffer_msgs(msgs or [])
       # break when non-full buffer is processed
       if len(msgs) < 254:
         return
 
+  def wait(self, timeout: float) -> None:
+    """Blocks until new frames may be available, or for at most timeout seconds"""
+    if self.receiver is not None:
+      with self.receiver.cv:
+        if not self.rx_buff:
+          self.receiver.cv.wait(timeout)
+    elif self._rx_empty and not self.rx_buff:
+      # nothing pending on the CAN source, don't spin on it
+      time.sleep(min(self.poll_interval, max(timeout, 0)))
+
   def recv(self, drain: bool = False) -> Generator[bytes, None, None]:
     # buffer rx messages in case two response messages are received at once
     # (e.g. response pending and success/failure response)
@@ -350,10 +429,17 @@ class CanClient():
       assert len(msg) <= 8
 
       self.tx(self.tx_addr, msg, self.bus)
+      # the separation time applies on the bus, so with a delay every frame is written on its own.
+      # without one all frames of the block go out together
+      if delay and self.flush is not None:
+        self.flush()
       # prevent rx buffer from overflowing on large tx
       if i % 10 == 9:
         self._recv_buffer()
 
+    if self.flush is not None:
+      self.flush()
+
 class IsoTpMessage():
   def __init__(self, can_client: CanClient, timeout: float = 1, debug: bool = False, max_len: int = 8):
     self._can_client = can_client
@@ -394,23 +480,28 @@ class IsoTpMessage():
     self._can_client.send([msg])
 
   def recv(self) -> Optional[bytes]:
-    start_time = time.time()
+    deadline = time.monotonic() + self.timeout
     try:
       while True:
         for msg in self._can_client.recv():
-          self._isotp_rx_next(msg)
+          if self._isotp_rx_next(msg):
+            # flow control wait, restart the timeout for the next flow control frame
+            deadline = time.monotonic() + self.timeout
           if self.tx_done and self.rx_done:
             return self.rx_dat
         # no timeout indicates non-blocking
         if self.timeout == 0:
           return None
-        if time.time() - start_time > self.timeout:
+        remaining = deadline - time.monotonic()
+        if remaining < 0:
           raise MessageTimeoutError("timeout waiting for response")
+        self._can_client.wait(remaining)
     finally:
       if self.debug and self.rx_dat:
         print(f"ISO-TP: RESPONSE - 0x{bytes.hex(self.rx_dat)}")
 
-  def _isotp_rx_next(self, rx_data: bytes) -> None:
+  def _isotp_rx_next(self, rx_data: bytes) -> bool:
+    """Handles one received frame, returns True on a flow control wait"""
     # single rx_frame
     if rx_data[0] >> 4 == 0x0:
       self.rx_len = rx_data[0] & 0xFF
@@ -419,7 +510,7 @@ class IsoTpMessage():
       self.rx_done = True
       if self.debug:
         print(f"ISO-TP: RX - single frame - idx={self.rx_idx} done={self.rx_done}")
-      return
+      return False
 
     # first rx_frame
     if rx_data[0] >> 4 == 0x1:
@@ -434,7 +525,7 @@ class IsoTpMessage():
       # send flow control message (send all bytes)
       msg = b"\x30\x00\x00".ljust(self.max_len, b"\x00")
       self._can_client.send([msg])
-      return
+      return False
 
     # consecutive rx frame
     if rx_data[0] >> 4 == 0x2:
@@ -447,7 +538,7 @@ class IsoTpMessage():
         self.rx_done = True
       if self.debug:
         print(f"ISO-TP: RX - consecutive frame - idx={self.rx_idx} done={self.rx_done}")
-      return
+      return False
 
     # flow control
     if rx_data[0] >> 4 == 0x3:
@@ -483,6 +574,8 @@ class IsoTpMessage():
         # wait (do nothing until next flow control message)
         if self.debug:
           print("ISO-TP: TX - flow control wait")
+        return True
+    return False
 
 FUNCTIONAL_ADDRS = [0x7DF, 0x18DB33F1]
 
@@ -503,13 +596,28 @@ def get_rx_addr_for_tx_addr(tx_addr, rx_offset=0x8):
 
 
 class UdsClient():
-  def __init__(self, panda, tx_addr: int, rx_addr: int = None, bus: int = 0, timeout: float = 1, debug: bool = False):
+  def __init__(self, panda, tx_addr: int, rx_addr: int = None, bus: int = 0, timeout: float = 1, debug: bool = False,
+               receiver: CanReceiver = None):
     self.bus = bus
     self.tx_addr = tx_addr
     self.rx_addr = rx_addr if rx_addr is not None else get_rx_addr_for_tx_addr(tx_addr)
     self.timeout = timeout
     self.debug = debug
-    self._can_client = CanClient(panda.can_send, panda.can_recv, self.tx_addr, self.rx_addr, self.bus, debug=self.debug)
+    # frames of a block of consecutive frames without separation time are queued and written together.
+    # panda-like objects without can_flush send every frame right away
+    can_flush = getattr(panda, 'can_flush', None)
+    can_send = partial(panda.can_send, flush=False) if can_flush is not None else panda.can_send
+    self._can_client = CanClient(can_send, panda.can_recv, self.tx_addr, self.rx_addr, self.bus,
+                                 debug=self.debug, receiver=receiver, can_flush=can_flush)
+
+  def close(self) -> None:
+    self._can_client.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
 
   # generic uds request
   def _uds_request(self, service_type: SERVICE_TYPE, subfunction: int = None, data: bytes = None) -> bytes:
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import time
+import unittest
+from collections import deque
+
+from panda.python.uds import CanClient, CanReceiver, UdsClient, DATA_IDENTIFIER_TYPE
+
+TX_ADDR = 0x7e0
+RX_ADDR = 0x7e8
+DATA_RECORD = bytes(range(40))  # first frame + 6 consecutive frames
+
+
+class FakeBus:
+  """Records when each frame is written to the bus. The simulated ECU asks for the given
+  separation time in its flow control frame"""
+  def __init__(self, st_min):
+    self.st_min = st_min
+    self.bus_log = []  # (time written, frame)
+    self.rx = deque()
+    self.rx_len = 0
+    self.rx_dat = b""
+
+  def _write(self, frames):
+    t = time.monotonic()
+    for dat in frames:
+      self.bus_log.append((t, dat))
+      self._ecu_rx(dat)
+
+  def can_recv(self):
+    ret = list(self.rx)
+    self.rx.clear()
+    return ret
+
+  def _ecu_rx(self, dat):
+    if dat[0] >> 4 == 0x1:
+      self.rx_len = (dat[0] & 0xF) << 8 | dat[1]
+      self.rx_dat = dat[2:]
+      self.rx.append((RX_ADDR, 0, bytes([0x30, 0x00, self.st_min]).ljust(8, b"\x00"), 0))
+    elif dat[0] >> 4 == 0x2:
+      self.rx_dat += dat[1:]
+      if len(self.rx_dat) >= self.rx_len:
+        resp = bytes([0x6E]) + self.rx_dat[1:3]
+        self.rx.append((RX_ADDR, 0, (bytes([len(resp)]) + resp).ljust(8, b"\x00"), 0))
+
+  def consecutive_frame_times(self):
+    return [t for t, dat in self.bus_log if dat[0] >> 4 == 0x2]
+
+
+class FakePanda(FakeBus):
+  """Queues frames like Panda.can_send with flush=False"""
+  def __init__(self, st_min):
+    super().__init__(st_min)
+    self.queue = []
+    self.flushes = 0
+
+  def can_send(self, addr, dat, bus, flush=True):
+    assert addr == TX_ADDR
+    self.queue.append(dat)
+    if flush:
+      self.can_flush()
+
+  def can_flush(self):
+    if not self.queue:
+      return
+    self.flushes += 1
+    self._write(self.queue)
+    self.queue.clear()
+
+  def can_recv(self):
+    self.can_flush()
+    return super().can_recv()
+
+
+class UnbufferedPanda(FakeBus):
+  """A panda-like object without can_flush, as used by debug scripts"""
+  def can_send(self, addr, dat, bus):
+    assert addr == TX_ADDR
+    self._write([dat])
+
+
+class TestUdsSeparationTime(unittest.TestCase):
+  def _write(self, panda):
+    UdsClient(panda, TX_ADDR).write_data_by_identifier(DATA_IDENTIFIER_TYPE.VIN, DATA_RECORD)
+    self.assertEqual(panda.rx_dat[:panda.rx_len][3:], DATA_RECORD)
+    return panda
+
+  def _assert_spacing(self, panda, st_min_sec):
+    times = panda.consecutive_frame_times()
+    self.assertEqual(len(times), 6)
+    for t0, t1 in zip(times, times[1:]):
+      self.assertGreaterEqual(t1 - t0, st_min_sec)
+
+  def test_st_min_ms(self):
+    self._assert_spacing(self._write(FakePanda(10)), 0.010)
+
+  def test_st_min_us(self):
+    # 0xF1-0xF9 is 100-900 us
+    self._assert_spacing(self._write(FakePanda(0xF9)), 0.0009)
+
+  def test_no_st_min_batches(self):
+    # without separation time the whole block of consecutive frames is one write
+    panda = self._write(FakePanda(0))
+    self.assertEqual(len(set(panda.consecutive_frame_times())), 1)
+    self.assertEqual(panda.flushes, 2)
+
+  def test_unbuffered_panda(self):
+    self._assert_spacing(self._write(UnbufferedPanda(10)), 0.010)
+    self._write(UnbufferedPanda(0))
+
+
+
+class TestCanReceiver(unittest.TestCase):
+  def setUp(self):
+    self.source = deque()
+    self.receiver = CanReceiver(self._can_recv)
+    self.receiver.start()
+
+  def tearDown(self):
+    self.receiver.stop()
+
+  def _can_recv(self):
+    ret = []
+    while self.source:
+      ret.append(self.source.popleft())
+    return ret
+
+  def _client(self):
+    return CanClient(None, None, TX_ADDR, RX_ADDR, 0, receiver=self.receiver)
+
+  def _receive(self, clients, n):
+    """Puts n frames on the bus and waits until every given client buffered them"""
+    expected = [len(c.rx_buff) + n for c in clients]
+    self.source.extend((RX_ADDR, 0, bytes([i] * 8), 0) for i in range(n))
+    deadline = time.monotonic() + 1.
+    while [len(c.rx_buff) for c in clients] != expected:
+      self.assertLess(time.monotonic(), deadline, "frames not buffered")
+      time.sleep(0.001)
+
+  def test_detach(self):
+    clients = [self._client() for _ in range(3)]
+    self._receive(clients, 5)
+
+    clients[0].close()
+    clients[0].close()
+    self.assertEqual(self.receiver.clients, clients[1:])
+    self.assertEqual(len(clients[0].rx_buff), 0)
+
+    # only the attached clients keep buffering
+    self._receive(clients[1:], 5)
+    self.assertEqual(len(clients[0].rx_buff), 0)
+    self.assertEqual([len(c.rx_buff) for c in clients[1:]], [10, 10])
+
+  def test_uds_client_context(self):
+    attached = self._client()
+    for _ in range(20):
+      with UdsClient(FakePanda(0), TX_ADDR, receiver=self.receiver) as uds_client:
+        self.assertIn(uds_client._can_client, self.receiver.clients)
+      self.assertNotIn(uds_client._can_client, self.receiver.clients)
+    self.assertEqual(self.receiver.clients, [attached])
+
+    self._receive([attached], 5)
+    self.assertEqual(len(uds_client._can_client.rx_buff), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
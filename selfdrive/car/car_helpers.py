@@ -2,7 +2,8 @@ import os
 from common.params import Params
 from common.basedir import BASEDIR
 from selfdrive.version import comma_remote, tested_branch
-from selfdrive.car.fingerprints import eliminate_incompatible_cars, all_legacy_fingerprint_cars
+from selfdrive.car.fingerprints import eliminate_incompatible_mask, all_legacy_fingerprint_cars, \
+                                       candidates_to_mask, mask_to_candidates, ALL_FINGERPRINT_CARS_MASK
 from selfdrive.car.vin import get_vin, VIN_UNKNOWN
 from selfdrive.car.fw_versions import get_fw_versions, match_fw_to_car
 from selfdrive.swaglog import cloudlog
@@ -81,8 +82,11 @@ interface_names = _get_interface_names()
 interfaces = load_interfaces(interface_names)
 
 
-def only_toyota_left(candidate_cars):
-  return all(("TOYOTA" in c or "LEXUS" in c) for c in candidate_cars) and len(candidate_cars) > 0
+TOYOTA_CARS_MASK = candidates_to_mask(c for c in all_legacy_fingerprint_cars() if "TOYOTA" in c or "LEXUS" in c)
+
+
+def only_toyota_left(candidates_mask):
+  return candidates_mask != 0 and candidates_mask & ~TOYOTA_CARS_MASK == 0
 
 
 # **** for use live only ****
@@ -118,7 +122,8 @@ def fingerprint(logcan, sendcan):
   Params().put("CarVin", vin)
 
   finger = gen_empty_fingerprint()
-  candidate_cars = {i: all_legacy_fingerprint_cars() for i in [0, 1]}  # attempt fingerprint on both bus 0 and 1
+  candidate_cars = {i: ALL_FINGERPRINT_CARS_MASK for i in [0, 1]}  # attempt fingerprint on both bus 0 and 1
+  seen_msgs = {i: set() for i in candidate_cars}  # (address, length) already applied to each bus' candidates
   frame = 0
   frame_fingerprint = 10  # 0.1s
   car_fingerprint = None
@@ -138,7 +143,10 @@ def fingerprint(logcan, sendcan):
       for b in candidate_cars:
         if (can.src == b or (only_toyota_left(candidate_cars[b]) and can.src == 2)) and \
            can.address < 0x800 and can.address not in [0x7df, 0x7e0, 0x7e8]:
-          candidate_cars[b] = eliminate_incompatible_cars(can, candidate_cars[b])
+          msg = (can.address, len(can.dat))
+          if msg not in seen_msgs[b]:
+            seen_msgs[b].add(msg)
+            candidate_cars[b] = eliminate_incompatible_mask(*msg, candidate_cars[b])
 
     # if we only have one car choice and the time since we got our first
     # message has elapsed, exit
@@ -146,12 +154,13 @@ def fingerprint(logcan, sendcan):
       # Toyota needs higher time to fingerprint, since DSU does not broadcast immediately
       if only_toyota_left(candidate_cars[b]):
         frame_fingerprint = 100  # 1s
-      if len(candidate_cars[b]) == 1 and frame > frame_fingerprint:
+      # exactly one candidate left
+      if candidate_cars[b] and not candidate_cars[b] & (candidate_cars[b] - 1) and frame > frame_fingerprint:
           # fingerprint done
-          car_fingerprint = candidate_cars[b][0]
+          car_fingerprint = mask_to_candidates(candidate_cars[b])[0]
 
     # bail if no cars left or we've been waiting for more than 2s
-    failed = (all(len(cc) == 0 for cc in candidate_cars.values()) and frame > frame_fingerprint) or frame > 200
+    failed = (all(cc == 0 for cc in candidate_cars.values()) and frame > frame_fingerprint) or frame > 200
     succeeded = car_fingerprint is not None
     done = failed or succeeded
 
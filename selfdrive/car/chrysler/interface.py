@@ -52,8 +52,7 @@ class CarInterface(CarInterfaceBase):
   # returns a car.CarState
   def update(self, c, can_strings):
     # ******************* do can recv *******************
-    self.cp.update_strings(can_strings)
-    self.cp_cam.update_strings(can_strings)
+    self.can_decoder.update_strings(can_strings)
 
     ret = self.CS.update(self.cp, self.cp_cam)
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 from opendbc.can.parser import CANParser
 from cereal import car
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 from selfdrive.car.chrysler.values import DBC
 
 RADAR_MSGS_C = list(range(0x2c2, 0x2d4+2, 2))  # c_ messages 706,...,724
@@ -70,7 +70,7 @@ class RadarInterface(RadarInterfaceBase):
       trackId = _address_to_track(ii)
 
       if trackId not in self.pts:
-        self.pts[trackId] = car.RadarData.RadarPoint.new_message()
+        self.pts[trackId] = RadarPoint()
         self.pts[trackId].trackId = trackId
         self.pts[trackId].aRel = float('nan')
         self.pts[trackId].yvRel = float('nan')
@@ -85,7 +85,7 @@ class RadarInterface(RadarInterfaceBase):
         self.pts[trackId].vRel = cpt['REL_SPEED']
 
     # We want a list, not a dictionary. Filter out LONG_DIST==0 because that means it's not valid.
-    ret.points = [x for x in self.pts.values() if x.dRel != 0]
+    self._fill_points(ret, [x for x in self.pts.values() if x.dRel != 0])
 
     self.updated_messages.clear()
     return ret
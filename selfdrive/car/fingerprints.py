@@ -1,4 +1,6 @@
 import os
+from collections import defaultdict
+
 from common.basedir import BASEDIR
 
 
@@ -45,6 +47,42 @@ def is_valid_for_fingerprint(msg, car_fingerprint):
   return (adr in car_fingerprint and car_fingerprint[adr] == len(msg.dat)) or adr >= 0x800
 
 
+def _build_fingerprint_masks(fingerprints):
+  # (address, length) -> bitset of cars with at least one fingerprint containing that message
+  masks = defaultdict(int)
+  for i, car_name in enumerate(fingerprints):
+    for fingerprint in fingerprints[car_name]:
+      for adr, length in {**fingerprint, **_DEBUG_ADDRESS}.items():  # add alien debug address
+        masks[(adr, length)] |= 1 << i
+  return dict(masks)
+
+
+# candidate sets used while fingerprinting are int bitsets, bit i is _FINGERPRINT_CARS[i]
+_FINGERPRINT_CARS = tuple(_FINGERPRINTS.keys())
+_FINGERPRINT_CAR_BITS = {car_name: 1 << i for i, car_name in enumerate(_FINGERPRINT_CARS)}
+_FINGERPRINT_MASKS = _build_fingerprint_masks(_FINGERPRINTS)
+ALL_FINGERPRINT_CARS_MASK = (1 << len(_FINGERPRINT_CARS)) - 1
+
+
+def candidates_to_mask(candidate_cars):
+  mask = 0
+  for car_name in candidate_cars:
+    mask |= _FINGERPRINT_CAR_BITS[car_name]
+  return mask
+
+
+def mask_to_candidates(mask):
+  return [car_name for i, car_name in enumerate(_FINGERPRINT_CARS) if mask >> i & 1]
+
+
+def eliminate_incompatible_mask(address, length, candidates_mask):
+  """Same as eliminate_incompatible_cars, on a bitset of candidate cars."""
+  # ignore addresses that are more than 11 bits
+  if address >= 0x800:
+    return candidates_mask
+  return candidates_mask & _FINGERPRINT_MASKS.get((address, length), 0)
+
+
 def eliminate_incompatible_cars(msg, candidate_cars):
   """Removes cars that could not have sent msg.
 
@@ -55,19 +93,8 @@ def eliminate_incompatible_cars(msg, candidate_cars):
      Returns:
       A list containing the subset of candidate_cars that could have sent msg.
   """
-  compatible_cars = []
-
-  for car_name in candidate_cars:
-    car_fingerprints = _FINGERPRINTS[car_name]
-
-    for fingerprint in car_fingerprints:
-      fingerprint.update(_DEBUG_ADDRESS)  # add alien debug address
-
-      if is_valid_for_fingerprint(msg, fingerprint):
-        compatible_cars.append(car_name)
-        break
-
-  return compatible_cars
+  compatible = eliminate_incompatible_mask(msg.address, len(msg.dat), ALL_FINGERPRINT_CARS_MASK)
+  return [car_name for car_name in candidate_cars if compatible & _FINGERPRINT_CAR_BITS[car_name]]
 
 
 def all_known_cars():
@@ -42,7 +42,7 @@ class CarInterface(CarInterfaceBase):
   # returns a car.CarState
   def update(self, c, can_strings):
     # ******************* do can recv *******************
-    self.cp.update_strings(can_strings)
+    self.can_decoder.update_strings(can_strings)
 
     ret = self.CS.update(self.cp)
 
@@ -3,7 +3,7 @@ from cereal import car
 from opendbc.can.parser import CANParser
 from selfdrive.car.ford.values import DBC
 from selfdrive.config import Conversions as CV
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 
 RADAR_MSGS = list(range(0x500, 0x540))
 
@@ -54,7 +54,7 @@ class RadarInterface(RadarInterfaceBase):
       # radar point only valid if there have been enough valid measurements
       if self.validCnt[ii] > 0:
         if ii not in self.pts:
-          self.pts[ii] = car.RadarData.RadarPoint.new_message()
+          self.pts[ii] = RadarPoint()
           self.pts[ii].trackId = self.track_id
           self.track_id += 1
         self.pts[ii].dRel = cpt['X_Rel']  # from front of car
@@ -67,6 +67,6 @@ class RadarInterface(RadarInterfaceBase):
         if ii in self.pts:
           del self.pts[ii]
 
-    ret.points = list(self.pts.values())
+    self._fill_points(ret, self.pts.values())
     self.updated_messages.clear()
     return ret
@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 import struct
 import traceback
-from typing import Any
+from typing import Any, Dict, NamedTuple, Optional, Tuple
 from collections import defaultdict
 
-from tqdm import tqdm
-
 import panda.python.uds as uds
 from cereal import car
 from selfdrive.car.fingerprints import FW_VERSIONS, get_attr_from_cars
-from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery
+from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery, run_parallel_queries
 from selfdrive.car.toyota.values import CAR as TOYOTA
 from selfdrive.swaglog import cloudlog
 
@@ -158,44 +156,87 @@ def build_fw_dict(fw_versions):
   return fw_versions_dict
 
 
-def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None):
-  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
-  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
-  the match is rejected."""
+# ECUs whose FW version has to be present for an exact match
+ESSENTIAL_ECUS = [Ecu.engine, Ecu.eps, Ecu.esp, Ecu.fwdRadar, Ecu.fwdCamera, Ecu.vsa]
+
+# These ECUs are known to be shared between models (EPS only between hybrid/ICE version)
+# Getting this exactly right isn't crucial, but excluding camera and radar makes it almost
+# impossible to get 3 matching versions, even if two models with shared parts are released at the same
+# time and only one is in our database.
+FUZZY_EXCLUDE_ECUS = [Ecu.fwdCamera, Ecu.fwdRadar, Ecu.eps]
+
+
+class FwIndex(NamedTuple):
+  """Lookup tables over FW_VERSIONS. Sets of candidates are int bitsets, bit i is candidates[i]."""
+  candidates: Tuple[str, ...]
+  # (ecu, addr, subaddr) -> (candidates with this ECU, candidates for which it may not be missing)
+  ecus: Dict[Tuple[int, int, Optional[int]], Tuple[int, int]]
+  # (ecu, addr, subaddr, version) -> candidates
+  exact: Dict[Tuple[int, int, Optional[int], bytes], int]
+  # (addr, subaddr, version) -> candidates, for non shared ECUs only
+  fuzzy: Dict[Tuple[int, Optional[int], bytes], int]
+
+  def to_candidates(self, bits):
+    return {c for i, c in enumerate(self.candidates) if bits >> i & 1}
+
+
+def build_fw_index(fw_versions):
+  candidates = tuple(fw_versions.keys())
+  ecus: Dict[Tuple[int, int, Optional[int]], Tuple[int, int]] = {}
+  exact: Dict[Tuple[int, int, Optional[int], bytes], int] = defaultdict(int)
+  fuzzy: Dict[Tuple[int, Optional[int], bytes], int] = defaultdict(int)
+
+  for i, candidate in enumerate(candidates):
+    bit = 1 << i
+    for ecu, versions in fw_versions[candidate].items():
+      ecu_type = ecu[0]
+      required = ecu_type in ESSENTIAL_ECUS
+      if ecu_type == Ecu.esp and candidate in [TOYOTA.RAV4, TOYOTA.COROLLA, TOYOTA.HIGHLANDER]:
+        required = False
+
+      # On some Toyota models, the engine can show on two different addresses
+      if ecu_type == Ecu.engine and candidate in [TOYOTA.CAMRY, TOYOTA.COROLLA_TSS2, TOYOTA.CHR, TOYOTA.LEXUS_IS]:
+        required = False
 
-  # These ECUs are known to be shared between models (EPS only between hybrid/ICE version)
-  # Getting this exactly right isn't crucial, but excluding camera and radar makes it almost
-  # impossible to get 3 matching versions, even if two models with shared parts are released at the same
-  # time and only one is in our database.
-  exclude_types = [Ecu.fwdCamera, Ecu.fwdRadar, Ecu.eps]
+      has, req = ecus.get(ecu, (0, 0))
+      ecus[ecu] = (has | bit, req | bit if required else req)
 
-  # Build lookup table from (addr, subaddr, fw) to list of candidate cars
-  all_fw_versions = defaultdict(list)
-  for candidate, fw_by_addr in FW_VERSIONS.items():
-    if candidate == exclude:
-      continue
+      for version in versions:
+        exact[(*ecu, version)] |= bit
+        if ecu_type not in FUZZY_EXCLUDE_ECUS:
+          fuzzy[(ecu[1], ecu[2], version)] |= bit
 
-    for addr, fws in fw_by_addr.items():
-      if addr[0] in exclude_types:
-        continue
-      for f in fws:
-        all_fw_versions[(addr[1], addr[2], f)].append(candidate)
+  return FwIndex(candidates, ecus, dict(exact), dict(fuzzy))
+
+
+FW_INDEX = build_fw_index(FW_VERSIONS)
+
+
+def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None, index=FW_INDEX):
+  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
+  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
+  the match is rejected."""
+  allowed = (1 << len(index.candidates)) - 1
+  if exclude in index.candidates:
+    allowed &= ~(1 << index.candidates.index(exclude))
 
   match_count = 0
   candidate = None
   for addr, version in fw_versions_dict.items():
     # All cars that have this FW response on the specified address
-    candidates = all_fw_versions[(addr[0], addr[1], version)]
+    candidates = index.fuzzy.get((addr[0], addr[1], version), 0) & allowed
 
-    if len(candidates) == 1:
+    # exactly one bit set, this version is unique to one car
+    if candidates and not candidates & (candidates - 1):
       match_count += 1
       if candidate is None:
-        candidate = candidates[0]
+        candidate = candidates
       # We uniquely matched two different cars. No fuzzy match possible
-      elif candidate != candidates[0]:
+      elif candidate != candidates:
         return set()
 
   if match_count >= 2:
+    candidate = index.candidates[candidate.bit_length() - 1]
     if log:
       cloudlog.error(f"Fingerprinted {candidate} using fuzzy match. {match_count} matching ECUs")
     return set([candidate])
@@ -203,36 +244,25 @@ def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None):
     return set()
 
 
-def match_fw_to_car_exact(fw_versions_dict):
+def match_fw_to_car_exact(fw_versions_dict, index=FW_INDEX):
   """Do an exact FW match. Returns all cars that match the given
   FW versions for a list of "essential" ECUs. If an ECU is not considered
   essential the FW version can be missing to get a fingerprint, but if it's present it
   needs to match the database."""
-  invalid = []
-  candidates = FW_VERSIONS
+  valid = (1 << len(index.candidates)) - 1
 
-  for candidate, fws in candidates.items():
-    for ecu, expected_versions in fws.items():
-      ecu_type = ecu[0]
-      addr = ecu[1:]
-      found_version = fw_versions_dict.get(addr, None)
-      ESSENTIAL_ECUS = [Ecu.engine, Ecu.eps, Ecu.esp, Ecu.fwdRadar, Ecu.fwdCamera, Ecu.vsa]
-      if ecu_type == Ecu.esp and candidate in [TOYOTA.RAV4, TOYOTA.COROLLA, TOYOTA.HIGHLANDER] and found_version is None:
-        continue
-
-      # On some Toyota models, the engine can show on two different addresses
-      if ecu_type == Ecu.engine and candidate in [TOYOTA.CAMRY, TOYOTA.COROLLA_TSS2, TOYOTA.CHR, TOYOTA.LEXUS_IS] and found_version is None:
-        continue
-
-      # Ignore non essential ecus
-      if ecu_type not in ESSENTIAL_ECUS and found_version is None:
-        continue
+  for ecu, (has, required) in index.ecus.items():
+    found_version = fw_versions_dict.get(ecu[1:], None)
+    if found_version is None:
+      valid &= ~required
+    else:
+      # cars without this ECU are unaffected, the others need to list the version
+      valid &= ~has | index.exact.get((*ecu, found_version), 0)
 
-      if found_version not in expected_versions:
-        invalid.append(candidate)
-        break
+    if not valid:
+      break
 
-  return set(candidates.keys()) - set(invalid)
+  return index.to_candidates(valid)
 
 
 def match_fw_to_car(fw_versions, allow_fuzzy=True):
@@ -278,20 +308,25 @@ def get_fw_versions(logcan, sendcan, bus, extra=None, timeout=0.1, debug=False,
 
   addrs.insert(0, parallel_addrs)
 
-  fw_versions = {}
-  for i, addr in enumerate(tqdm(addrs, disable=not progress)):
+  # Queries to different ECUs run concurrently, the ones sharing an address run in this order
+  queries = []
+  for i, addr in enumerate(addrs):
     for addr_chunk in chunks(addr):
       for brand, request, response, response_offset in REQUESTS:
         try:
-          addrs = [(a, s) for (b, a, s) in addr_chunk if b in (brand, 'any')]
+          query_addrs = [(a, s) for (b, a, s) in addr_chunk if b in (brand, 'any')]
 
-          if addrs:
-            query = IsoTpParallelQuery(sendcan, logcan, bus, addrs, request, response, response_offset, debug=debug)
+          if query_addrs:
+            query = IsoTpParallelQuery(sendcan, logcan, bus, query_addrs, request, response, response_offset, debug=debug)
             t = 2 * timeout if i == 0 else timeout
-            fw_versions.update(query.get_data(t))
+            queries.append((query, t))
         except Exception:
           cloudlog.warning(f"FW query exception: {traceback.format_exc()}")
 
+  fw_versions = {}
+  for query_results in run_parallel_queries(logcan, queries, progress=progress):
+    fw_versions.update(query_results)
+
   # Build capnp list to put into CarParams
   car_fw = []
   for addr, version in fw_versions.items():
@@ -114,7 +114,7 @@ class CarInterface(CarInterfaceBase):
 
   # returns a car.CarState
   def update(self, c, can_strings):
-    self.cp.update_strings(can_strings)
+    self.can_decoder.update_strings(can_strings)
 
     ret = self.CS.update(self.cp)
 
@@ -5,7 +5,7 @@ from cereal import car
 from opendbc.can.parser import CANParser
 from selfdrive.car.gm.values import DBC, CAR, CanBus
 from selfdrive.config import Conversions as CV
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 
 RADAR_HEADER_MSG = 1120
 SLOT_1_MSG = RADAR_HEADER_MSG + 1
@@ -88,7 +88,7 @@ class RadarInterface(RadarInterfaceBase):
         targetId = cpt['TrkObjectID']
         currentTargets.add(targetId)
         if targetId not in self.pts:
-          self.pts[targetId] = car.RadarData.RadarPoint.new_message()
+          self.pts[targetId] = RadarPoint()
           self.pts[targetId].trackId = targetId
         distance = cpt['TrkRange']
         self.pts[targetId].dRel = distance  # from front of car
@@ -102,6 +102,6 @@ class RadarInterface(RadarInterfaceBase):
       if oldTarget not in currentTargets:
         del self.pts[oldTarget]
 
-    ret.points = list(self.pts.values())
+    self._fill_points(ret, self.pts.values())
     self.updated_messages.clear()
     return ret
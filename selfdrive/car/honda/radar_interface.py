@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 from cereal import car
 from opendbc.can.parser import CANParser
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 from selfdrive.car.honda.values import DBC
 
 def _create_nidec_can_parser(car_fingerprint):
@@ -61,7 +61,7 @@ class RadarInterface(RadarInterfaceBase):
         self.radar_wrong_config = cpt['RADAR_STATE'] == 0x69
       elif cpt['LONG_DIST'] < 255:
         if ii not in self.pts or cpt['NEW_TRACK']:
-          self.pts[ii] = car.RadarData.RadarPoint.new_message()
+          self.pts[ii] = RadarPoint()
           self.pts[ii].trackId = self.track_id
           self.track_id += 1
         self.pts[ii].dRel = cpt['LONG_DIST']  # from front of car
@@ -83,6 +83,6 @@ class RadarInterface(RadarInterfaceBase):
       errors.append("wrongConfig")
     ret.errors = errors
 
-    ret.points = list(self.pts.values())
+    self._fill_points(ret, self.pts.values())
 
     return ret
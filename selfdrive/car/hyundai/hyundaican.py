@@ -1,8 +1,10 @@
 import copy
 import crcmod
-from common.params import Params
+from common.params import CachedParams
 from selfdrive.car.hyundai.values import CAR, CHECKSUM
 
+params = CachedParams()
+
 hyundai_checksum = crcmod.mkCrcFun(0x11D, initCrc=0xFD, rev=False, xorOut=0xdf)
 
 def create_lkas11(packer, frame, car_fingerprint, apply_steer, steer_req, lkas11, sys_warning, sys_state,
@@ -25,15 +27,17 @@ def create_lkas11(packer, frame, car_fingerprint, apply_steer, steer_req, lkas11
   elif car_fingerprint in [CAR.K5, CAR.K5_HEV, CAR.K7, CAR.K7_HEV]:
     values["CF_Lkas_LdwsActivemode"] = 0
 
+  mfc_select = params.get("MfcSelect", encoding='utf8')
+
   # This field is LDWS Mfc car ( qt ui toggle set )
-  if Params().get("MfcSelect", encoding='utf8') == "1":
+  if mfc_select == "1":
     values["CF_Lkas_LdwsActivemode"] = 0
     values["CF_Lkas_LdwsOpt_USM"] = 3
     values["CF_Lkas_FcwOpt_USM"] = 2 if enabled else 1
 #    values["CF_Lkas_SysWarning"] = 4 if sys_warning else 0
 
   # This field is LFA Mfc car ( qt ui toggle set )
-  if Params().get("MfcSelect", encoding='utf8') == "2":
+  if mfc_select == "2":
     values["CF_Lkas_LdwsActivemode"] = int(left_lane) + (int(right_lane) << 1)
     values["CF_Lkas_LdwsOpt_USM"] = 2
     values["CF_Lkas_FcwOpt_USM"] = 2 if enabled else 1
@@ -5,17 +5,20 @@ from selfdrive.car.hyundai.values import CAR, Buttons
 from selfdrive.car import STD_CARGO_KG, scale_rot_inertia, scale_tire_stiffness, gen_empty_fingerprint
 from selfdrive.car.interfaces import CarInterfaceBase
 from selfdrive.controls.lib.lateral_planner import LANE_CHANGE_SPEED_MIN
-from common.params import Params
+from common.params import CachedParams
 
 GearShifter = car.CarState.GearShifter
 EventName = car.CarEvent.EventName
 ButtonType = car.CarState.ButtonEvent.Type
 
+params = CachedParams()
+
 class CarInterface(CarInterfaceBase):
   def __init__(self, CP, CarController, CarState):
     super().__init__(CP, CarController, CarState)
     self.cp2 = self.CS.get_can2_parser(CP)
-    self.mad_mode_enabled = Params().get("LongControlSelect", encoding='utf8') == "0"
+    self.can_decoder.attach(self.cp2)
+    self.mad_mode_enabled = params.get("LongControlSelect", encoding='utf8') == "0"
     self.lkas_button_alert = False
 
   @staticmethod
@@ -25,7 +28,7 @@ class CarInterface(CarInterfaceBase):
   @staticmethod
   def get_params(candidate, fingerprint=gen_empty_fingerprint(), car_fw=[]):  # pylint: disable=dangerous-default-value
     ret = CarInterfaceBase.get_std_params(candidate, fingerprint)
-    ret.openpilotLongitudinalControl = Params().get("LongControlSelect", encoding='utf8') == "1"
+    ret.openpilotLongitudinalControl = params.get("LongControlSelect", encoding='utf8') == "1"
 
     ret.carName = "hyundai"
     ret.safetyModel = car.CarParams.SafetyModel.hyundaiLegacy
@@ -149,7 +152,7 @@ class CarInterface(CarInterfaceBase):
         ret.steerRatio = 13.0
 
     # -----------------------------------------------------------------PID
-    if Params().get("LateralControlSelect", encoding='utf8') == "0":
+    if params.get("LateralControlSelect", encoding='utf8') == "0":
       if candidate in [CAR.GENESIS, CAR.GENESIS_G70, CAR.GENESIS_G80, CAR.GENESIS_G90]:
           ret.lateralTuning.pid.kf = 0.00005
           ret.lateralTuning.pid.kpBP = [0.]
@@ -169,7 +172,7 @@ class CarInterface(CarInterfaceBase):
           ret.lateralTuning.pid.kiBP = [0.]
           ret.lateralTuning.pid.kiV = [0.05]
     # -----------------------------------------------------------------INDI
-    elif Params().get("LateralControlSelect", encoding='utf8') == "1":
+    elif params.get("LateralControlSelect", encoding='utf8') == "1":
       if candidate in [CAR.GENESIS]:
           ret.lateralTuning.init('indi')
           ret.lateralTuning.indi.innerLoopGainBP = [0.]
@@ -211,7 +214,7 @@ class CarInterface(CarInterfaceBase):
           ret.lateralTuning.indi.actuatorEffectivenessBP = [0.]
           ret.lateralTuning.indi.actuatorEffectivenessV = [2.3]
     # -----------------------------------------------------------------LQR
-    elif Params().get("LateralControlSelect", encoding='utf8') == "2":
+    elif params.get("LateralControlSelect", encoding='utf8') == "2":
       if candidate in [CAR.GENESIS, CAR.GENESIS_G70, CAR.GENESIS_G80, CAR.GENESIS_G90]:
           ret.lateralTuning.init('lqr')
           ret.lateralTuning.lqr.scale = 1900.
@@ -330,15 +333,13 @@ class CarInterface(CarInterfaceBase):
     ret.pcmCruise = not ret.radarOffCan
 
     # set safety_hyundai_community only for non-SCC, MDPS harrness or SCC harrness cars or cars that have unknown issue
-    if ret.radarOffCan or ret.mdpsBus == 1 or ret.openpilotLongitudinalControl or ret.sccBus == 1 or Params().get("LongControlSelect", encoding='utf8') == "0":
+    if ret.radarOffCan or ret.mdpsBus == 1 or ret.openpilotLongitudinalControl or ret.sccBus == 1 or params.get("LongControlSelect", encoding='utf8') == "0":
       ret.safetyModel = car.CarParams.SafetyModel.hyundaiCommunity
 
     return ret
 
   def update(self, c, can_strings):
-    self.cp.update_strings(can_strings)
-    self.cp2.update_strings(can_strings)
-    self.cp_cam.update_strings(can_strings)
+    self.can_decoder.update_strings(can_strings)
 
     ret = self.CS.update(self.cp, self.cp2, self.cp_cam)
     ret.canValid = self.cp.can_valid and self.cp2.can_valid and self.cp_cam.can_valid
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 from cereal import car
 from opendbc.can.parser import CANParser
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 from selfdrive.car.hyundai.values import DBC
 
 
@@ -56,7 +56,7 @@ class RadarInterface(RadarInterfaceBase):
     if valid:
       for ii in range(2):
         if ii not in self.pts:
-          self.pts[ii] = car.RadarData.RadarPoint.new_message()
+          self.pts[ii] = RadarPoint()
           self.pts[ii].trackId = self.track_id
           self.track_id += 1
         self.pts[ii].dRel = cpt["SCC11"]['ACC_ObjDist']  # from front of car
@@ -66,5 +66,5 @@ class RadarInterface(RadarInterfaceBase):
         self.pts[ii].yvRel = float('nan')
         self.pts[ii].measured = True
 
-    ret.points = list(self.pts.values())
+    self._fill_points(ret, self.pts.values())
     return ret
@@ -2,6 +2,8 @@ import os
 import time
 from typing import Dict
 
+import numpy as np
+
 from cereal import car
 from common.kalman.simple_kalman import KF1D
 from common.realtime import DT_CTRL
@@ -10,6 +12,7 @@ from selfdrive.config import Conversions as CV
 from selfdrive.controls.lib.drive_helpers import V_CRUISE_MAX
 from selfdrive.controls.lib.events import Events
 from selfdrive.controls.lib.vehicle_model import VehicleModel
+from opendbc.can.parser import CANDecoder
 
 GearShifter = car.CarState.GearShifter
 EventName = car.CarEvent.EventName
@@ -40,6 +43,9 @@ class CarInterfaceBase():
       self.cp_cam = self.CS.get_cam_can_parser(CP)
       self.cp_body = self.CS.get_body_can_parser(CP)
 
+      # all parsers share a single decode of the can strings
+      self.can_decoder = CANDecoder([self.cp, self.cp_cam, self.cp_body])
+
     self.CC = None
     if CarController is not None:
       self.CC = CarController(self.cp.dbc_name, CP, self.VM)
@@ -156,6 +162,25 @@ class CarInterfaceBase():
     return events
 
 
+# same fields and precision as car.RadarData.RadarPoint
+RADAR_POINT_DTYPE = np.dtype([('trackId', np.uint64), ('dRel', np.float32), ('yRel', np.float32), ('vRel', np.float32),
+                              ('aRel', np.float32), ('yvRel', np.float32), ('measured', bool)])
+
+
+class RadarPoint():
+  """Plain python radar point, cheaper to create and update than a car.RadarData.RadarPoint builder"""
+  __slots__ = ('trackId', 'dRel', 'yRel', 'vRel', 'aRel', 'yvRel', 'measured')
+
+  def __init__(self, trackId=0):
+    self.trackId = trackId
+    self.dRel = 0.
+    self.yRel = 0.
+    self.vRel = 0.
+    self.aRel = float('nan')
+    self.yvRel = float('nan')
+    self.measured = False
+
+
 class RadarInterfaceBase():
   def __init__(self, CP):
     self.pts = {}
@@ -163,12 +188,40 @@ class RadarInterfaceBase():
     self.radar_ts = CP.radarTimeStep
     self.no_radar_sleep = 'NO_RADAR_SLEEP' in os.environ
 
+    # points of the last RadarData as a RADAR_POINT_DTYPE array, radard reads them here instead of from capnp.
+    # This is a view into a buffer that is reused by the next update. radard sets it to None before every update
+    # and reads ret.points instead when it's still None after, see _fill_points
+    self._points_buf = np.zeros(64, dtype=RADAR_POINT_DTYPE)
+    self.points = self._points_buf[:0]
+
   def update(self, can_strings):
     ret = car.RadarData.new_message()
+    self.points = self._points_buf[:0]
     if not self.no_radar_sleep:
       time.sleep(self.radar_ts)  # radard runs on RI updates
     return ret
 
+  def _fill_points(self, ret, pts):
+    """Writes RadarPoints into ret as one pre-sized list and into self.points.
+
+    Radar interfaces should fill the points of the RadarData they return with this, radard reads them from
+    self.points. Points written to ret.points directly leave self.points None, radard then decodes them from ret"""
+    pts = [(p.trackId, p.dRel, p.yRel, p.vRel, p.aRel, p.yvRel, p.measured) for p in pts]
+    n = len(pts)
+    if n > len(self._points_buf):
+      self._points_buf = np.zeros(max(n, 2 * len(self._points_buf)), dtype=RADAR_POINT_DTYPE)
+    self.points = self._points_buf[:n]
+    self.points[:] = pts
+
+    for pt, (track_id, d_rel, y_rel, v_rel, a_rel, yv_rel, measured) in zip(ret.init('points', n), pts):
+      pt.trackId = track_id
+      pt.dRel = d_rel
+      pt.yRel = y_rel
+      pt.vRel = v_rel
+      pt.aRel = a_rel
+      pt.yvRel = yv_rel
+      pt.measured = measured
+
 
 class CarStateBase:
   def __init__(self, CP):
@@ -1,7 +1,10 @@
 import time
+import traceback
 from collections import defaultdict
 from functools import partial
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+from tqdm import tqdm
 
 import cereal.messaging as messaging
 from selfdrive.swaglog import cloudlog
@@ -31,8 +34,9 @@ class IsoTpParallelQuery:
 
   def rx(self):
     """Drain can socket and sort messages into buffers based on address"""
-    can_packets = messaging.drain_sock(self.logcan, wait_for_one=True)
+    self._rx_packets(messaging.drain_sock(self.logcan, wait_for_one=True))
 
+  def _rx_packets(self, can_packets):
     for packet in can_packets:
       for msg in packet.can:
         if msg.src == self.bus:
@@ -71,13 +75,27 @@ class IsoTpParallelQuery:
     messaging.drain_sock(self.logcan)
     self.msg_buffer = defaultdict(list)
 
-  def get_data(self, timeout):
-    self._drain_rx()
+  def conflicts(self, other):
+    """Two queries can't run at the same time when they talk to the same ECU, or listen on the same address"""
+    if self.bus != other.bus:
+      return False
+    if self.functional_addr or other.functional_addr:
+      return True
+
+    addrs = {a[0] for a in self.msg_addrs} | set(self.msg_addrs.values())
+    other_addrs = {a[0] for a in other.msg_addrs} | set(other.msg_addrs.values())
+    return not addrs.isdisjoint(other_addrs)
+
+  def _start(self, timeout):
+    """Send the first request to every ECU, responses are collected by _step"""
+    self.msg_buffer = defaultdict(list)
+    self.timeout = timeout
+    self.results = {}
 
     # Create message objects
-    msgs = {}
-    request_counter = {}
-    request_done = {}
+    self.msgs = {}
+    self.request_counter = {}
+    self.request_done = {}
     for tx_addr, rx_addr in self.msg_addrs.items():
       # rx_addr not set when using functional tx addr
       id_addr = rx_addr or tx_addr[0]
@@ -91,40 +109,102 @@ class IsoTpParallelQuery:
       msg = IsoTpMessage(can_client, timeout=0, max_len=max_len, debug=self.debug)
       msg.send(self.request[0])
 
-      msgs[tx_addr] = msg
-      request_counter[tx_addr] = 0
-      request_done[tx_addr] = False
+      self.msgs[tx_addr] = msg
+      self.request_counter[tx_addr] = 0
+      self.request_done[tx_addr] = False
 
-    results = {}
-    start_time = time.time()
-    while True:
-      self.rx()
+    self.start_time = time.time()
 
-      if all(request_done.values()):
-        break
+  def _step(self):
+    """Process buffered responses, returns True once every ECU answered or the query timed out"""
+    if all(self.request_done.values()):
+      return True
 
-      for tx_addr, msg in msgs.items():
-        dat: Optional[bytes] = msg.recv()
+    for tx_addr, msg in self.msgs.items():
+      if self.request_done[tx_addr]:
+        continue
 
-        if not dat:
-          continue
+      dat: Optional[bytes] = msg.recv()
 
-        counter = request_counter[tx_addr]
-        expected_response = self.response[counter]
-        response_valid = dat[:len(expected_response)] == expected_response
+      if not dat:
+        continue
 
-        if response_valid:
-          if counter + 1 < len(self.request):
-            msg.send(self.request[counter + 1])
-            request_counter[tx_addr] += 1
-          else:
-            results[tx_addr] = dat[len(expected_response):]
-            request_done[tx_addr] = True
+      counter = self.request_counter[tx_addr]
+      expected_response = self.response[counter]
+      response_valid = dat[:len(expected_response)] == expected_response
+
+      if response_valid:
+        if counter + 1 < len(self.request):
+          msg.send(self.request[counter + 1])
+          self.request_counter[tx_addr] += 1
         else:
-          request_done[tx_addr] = True
-          cloudlog.warning(f"iso-tp query bad response: 0x{dat.hex()}")
+          self.results[tx_addr] = dat[len(expected_response):]
+          self.request_done[tx_addr] = True
+      else:
+        self.request_done[tx_addr] = True
+        cloudlog.warning(f"iso-tp query bad response: 0x{dat.hex()}")
+
+    return all(self.request_done.values()) or time.time() - self.start_time > self.timeout
 
-      if time.time() - start_time > timeout:
+  def get_data(self, timeout):
+    self._drain_rx()
+    self._start(timeout)
+
+    while True:
+      self.rx()
+      if self._step():
         break
 
-    return results
+    return self.results
+
+
+def run_parallel_queries(logcan, queries: List[Tuple[IsoTpParallelQuery, float]], progress=False) -> List[Dict]:
+  """Run queries concurrently, sharing one logcan socket.
+
+  A query is started as soon as no running or earlier query uses any of its addresses on the same bus,
+  so queries to the same ECU still run in order. Each query ends once every ECU answered or after its
+  own timeout. Returns the results of each query, in the order they were given."""
+  messaging.drain_sock(logcan)
+
+  results: List[Dict] = [{} for _ in queries]
+  pending = list(range(len(queries)))
+  active: List[int] = []
+
+  with tqdm(total=len(queries), disable=not progress) as pbar:
+    while pending or active:
+      # start every query that doesn't conflict with a running or an earlier pending one
+      blocking = [queries[i][0] for i in active]
+      still_pending = []
+      for i in pending:
+        query, timeout = queries[i]
+        if any(query.conflicts(q) for q in blocking):
+          still_pending.append(i)
+        else:
+          try:
+            query._start(timeout)
+            active.append(i)
+          except Exception:
+            cloudlog.warning(f"iso-tp query exception: {traceback.format_exc()}")
+            pbar.update(1)
+        blocking.append(query)
+      pending = still_pending
+
+      if not active:
+        continue
+
+      can_packets = messaging.drain_sock(logcan, wait_for_one=True)
+      for i in list(active):
+        query = queries[i][0]
+        try:
+          query._rx_packets(can_packets)
+          done = query._step()
+        except Exception:
+          cloudlog.warning(f"iso-tp query exception: {traceback.format_exc()}")
+          done = True
+
+        if done:
+          results[i] = query.results
+          active.remove(i)
+          pbar.update(1)
+
+  return results
@@ -2,7 +2,7 @@
 from cereal import car
 from opendbc.can.parser import CANParser
 from selfdrive.car.tesla.values import DBC, CANBUS
-from selfdrive.car.interfaces import RadarInterfaceBase
+from selfdrive.car.interfaces import RadarInterfaceBase, RadarPoint
 
 RADAR_MSGS_A = list(range(0x310, 0x36E, 3))
 RADAR_MSGS_B = list(range(0x311, 0x36F, 3))
@@ -94,7 +94,7 @@ class RadarInterface(RadarInterfaceBase):
 
       # New track!
       if i not in self.pts:
-        self.pts[i] = car.RadarData.RadarPoint.new_message()
+        self.pts[i] = RadarPoint()
         self.pts[i].trackId = self.track_id
         self.track_id += 1
 
@@ -106,6 +106,6 @@ class RadarInterface(RadarInterfaceBase):
       self.pts[i].yvRel = msg_b['LatSpeed']
       self.pts[i].measured = bool(msg_a['Meas'])
 
-    ret.points = list(self.pts.values())
+    self._fill_points(ret, self.pts.values())
     self.updated_messages.clear()
     return ret
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import time
+import unittest
+from collections import deque
+
+import cereal.messaging as messaging
+from selfdrive.boardd.boardd import can_list_to_can_capnp
+from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery, run_parallel_queries
+
+BUS = 1
+REQUEST = b'\x22\xf1\x00'
+RESPONSE = b'\x62\xf1\x00'
+
+
+class FakeLogcan:
+  """Frames sent by the simulated ECUs show up one receive later, like a response on a real bus.
+  Requests and completed responses are logged in order in events"""
+  def __init__(self):
+    self.queue = deque()  # (frame, event logged on delivery)
+    self.in_flight = deque()
+    self.events = []
+
+  def _deliver(self, frames):
+    ret = []
+    for dat, event in frames:
+      if event is not None:
+        self.events.append(event)
+      ret.append(dat)
+    return ret
+
+  def receive(self, non_blocking=False):
+    return self._deliver([self.queue.popleft()])[0] if len(self.queue) else None
+
+  def receive_many(self, wait_for_one=False):
+    ret = self._deliver(self.queue)
+    self.queue = self.in_flight
+    self.in_flight = deque()
+    return ret
+
+
+class SimulatedEcus:
+  """Answers ISO-TP requests sent on a fake sendcan, responses show up on the fake logcan"""
+  def __init__(self, logcan, versions, rx_offset=0x8):
+    self.logcan = logcan
+    self.versions = versions  # tx addr -> version
+    self.rx_offset = rx_offset
+    self.pending = {}  # tx addr -> remaining consecutive frames, sent after flow control
+    self.requests = []
+
+  def _reply(self, addr, dat, last=True):
+    event = ("response", addr) if last else None
+    self.logcan.in_flight.append((can_list_to_can_capnp([[addr + self.rx_offset, 0, dat, BUS]]), event))
+
+  def send(self, dat):
+    for msg in messaging.log_from_bytes(dat).sendcan:
+      if msg.src != BUS or msg.address not in self.versions:
+        continue
+
+      dat = msg.dat
+      if dat[0] >> 4 == 0x3 and msg.address in self.pending:
+        frames = self.pending.pop(msg.address)
+        for i, frame in enumerate(frames):
+          self._reply(msg.address, frame, last=i == len(frames) - 1)
+      elif dat[0] >> 4 == 0x0 and dat[1:1 + dat[0]] == REQUEST:
+        self.requests.append(msg.address)
+        self.logcan.events.append(("request", msg.address))
+        resp = RESPONSE + self.versions[msg.address]
+        if len(resp) < 8:
+          self._reply(msg.address, (bytes([len(resp)]) + resp).ljust(8, b"\x00"))
+        else:
+          self._reply(msg.address, bytes([0x10 | len(resp) >> 8, len(resp) & 0xFF]) + resp[:6], last=False)
+          self.pending[msg.address] = [(bytes([0x20 | (i + 1) & 0xF]) + resp[6 + 7 * i:13 + 7 * i]).ljust(8, b"\x00")
+                                       for i in range((len(resp) - 6 + 6) // 7)]
+
+
+class TestIsoTpParallelQuery(unittest.TestCase):
+  def setUp(self):
+    self.logcan = FakeLogcan()
+    self.ecus = SimulatedEcus(self.logcan, {
+      0x7e0: b'\x01',
+      0x7e1: b'LONG VERSION 1.02',
+      0x7d0: b'\x03',
+    })
+
+  def _query(self, addrs):
+    return IsoTpParallelQuery(self.ecus, self.logcan, BUS, addrs, [REQUEST], [RESPONSE])
+
+  def test_get_data(self):
+    results = self._query([0x7e0, 0x7e1]).get_data(0.1)
+    self.assertEqual(results, {(0x7e0, None): b'\x01', (0x7e1, None): b'LONG VERSION 1.02'})
+
+  def test_parallel_queries(self):
+    queries = [(self._query([0x7e0]), 0.1), (self._query([0x7e1, 0x7d0]), 0.1), (self._query([0x7e0, 0x7d0]), 0.1)]
+    results = run_parallel_queries(self.logcan, queries)
+
+    self.assertEqual(results[0], {(0x7e0, None): b'\x01'})
+    self.assertEqual(results[1], {(0x7e1, None): b'LONG VERSION 1.02', (0x7d0, None): b'\x03'})
+    self.assertEqual(results[2], {(0x7e0, None): b'\x01', (0x7d0, None): b'\x03'})
+
+    # query 2 shares 0x7e0 with query 0, its request is only sent once query 0 got its response
+    events = self.logcan.events
+    requests_7e0 = [i for i, e in enumerate(events) if e == ("request", 0x7e0)]
+    self.assertEqual(len(requests_7e0), 2)
+    self.assertGreater(requests_7e0[1], events.index(("response", 0x7e0)))
+
+    # query 1 doesn't conflict with query 0, it runs while query 0 waits for its response
+    self.assertLess(events.index(("request", 0x7e1)), events.index(("response", 0x7e0)))
+    self.assertLess(events.index(("request", 0x7d0)), events.index(("response", 0x7e0)))
+
+  def test_missing_ecus_timeout(self):
+    # one missing ECU per query, all queries are independent so they time out together
+    timeout = 0.2
+    queries = [(self._query([addr, 0x700 + i]), timeout) for i, addr in enumerate([0x7e0, 0x7e1, 0x7d0])]
+
+    start = time.monotonic()
+    results = run_parallel_queries(self.logcan, queries)
+    self.assertLess(time.monotonic() - start, 2 * timeout)
+    self.assertEqual([len(r) for r in results], [1, 1, 1])
+
+  def test_early_exit(self):
+    # all ECUs answer, so the query doesn't wait for its timeout
+    start = time.monotonic()
+    run_parallel_queries(self.logcan, [(self._query([0x7e0, 0x7e1, 0x7d0]), 5.)])
+    self.assertLess(time.monotonic() - start, 1.)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -6,7 +6,7 @@ from numbers import Number
 from cereal import car, log
 from common.numpy_fast import clip
 from common.realtime import sec_since_boot, config_realtime_process, Priority, Ratekeeper, DT_CTRL
-from common.profiler import Profiler
+from common.profiler import HistogramProfiler
 from common.params import Params, put_nonblocking
 import cereal.messaging as messaging
 from selfdrive.config import Conversions as CV
@@ -35,6 +35,7 @@ STEER_ANGLE_SATURATION_THRESHOLD = 2.5  # Degrees
 
 SIMULATION = "SIMULATION" in os.environ
 NOSENSOR = "NOSENSOR" in os.environ
+MSG_STATS = "MSG_STATS" in os.environ  # publish messaging telemetry, see selfdrive/debug/msg_stats.py
 IGNORE_PROCESSES = {"shutdownd", "rtshield", "uploader", "deleter", "loggerd", "logmessaged", "tombstoned",
                     "logcatd", "proclogd", "clocksd", "updated", "timezoned", "manage_athenad"} | \
                     {k for k, v in managed_processes.items() if not v.enabled}
@@ -58,7 +59,8 @@ class Controls:
     self.pm = pm
     if self.pm is None:
       self.pm = messaging.PubMaster(['sendcan', 'controlsState', 'carState',
-                                     'carControl', 'carEvents', 'carParams'])
+                                     'carControl', 'carEvents', 'carParams', 'controlsProfile'],
+                                     stats_name='controlsd' if MSG_STATS else None)
 
     self.camera_packets = ["roadCameraState", "driverCameraState"]
     if TICI:
@@ -74,7 +76,8 @@ class Controls:
       self.sm = messaging.SubMaster(['deviceState', 'pandaState', 'modelV2', 'liveCalibration',
                                      'driverMonitoringState', 'longitudinalPlan', 'lateralPlan', 'liveLocationKalman',
                                      'managerState', 'liveParameters', 'radarState'] + self.camera_packets + joystick_packet,
-                                     ignore_alive=ignore, ignore_avg_freq=['radarState', 'longitudinalPlan'])
+                                     ignore_alive=ignore, ignore_avg_freq=['radarState', 'longitudinalPlan'], lazy=True,
+                                     stats_name='controlsd' if MSG_STATS else None)
 
     self.can_sock = can_sock
     if can_sock is None:
@@ -176,7 +179,7 @@ class Controls:
 
     # controlsd is driven by can recv, expected at 100Hz
     self.rk = Ratekeeper(100, print_delay_threshold=None)
-    self.prof = Profiler(False)  # off by default
+    self.prof = HistogramProfiler()
 
   def update_events(self, CS):
     """Compute carEvents from carState"""
@@ -602,7 +605,7 @@ class Controls:
     curvature = -self.VM.calc_curvature(steer_angle_without_offset, CS.vEgo)
 
     # controlsState
-    dat = messaging.new_message('controlsState')
+    dat = self.pm.new_message('controlsState')
     dat.valid = CS.canValid
     controlsState = dat.controlsState
     controlsState.alertText1 = self.AM.alert_text_1
@@ -647,7 +650,7 @@ class Controls:
 
     # carState
     car_events = self.events.to_msg()
-    cs_send = messaging.new_message('carState')
+    cs_send = self.pm.new_message('carState')
     cs_send.valid = CS.canValid
     cs_send.carState = CS
     cs_send.carState.events = car_events
@@ -655,19 +658,19 @@ class Controls:
 
     # carEvents - logged every second or on change
     if (self.sm.frame % int(1. / DT_CTRL) == 0) or (self.events.names != self.events_prev):
-      ce_send = messaging.new_message('carEvents', len(self.events))
+      ce_send = self.pm.new_message('carEvents', len(self.events))
       ce_send.carEvents = car_events
       self.pm.send('carEvents', ce_send)
     self.events_prev = self.events.names.copy()
 
     # carParams - logged every 50 seconds (> 1 per segment)
     if (self.sm.frame % int(50. / DT_CTRL) == 0):
-      cp_send = messaging.new_message('carParams')
+      cp_send = self.pm.new_message('carParams')
       cp_send.carParams = self.CP
       self.pm.send('carParams', cp_send)
 
     # carControl
-    cc_send = messaging.new_message('carControl')
+    cc_send = self.pm.new_message('carControl')
     cc_send.valid = CS.canValid
     cc_send.carControl = CC
     self.pm.send('carControl', cc_send)
@@ -698,12 +701,22 @@ class Controls:
     # Publish data
     self.publish_logs(CS, start_time, actuators, lac_log)
     self.prof.checkpoint("Sent")
+    self.prof.step()
+
+    # controlsProfile - per stage step latency, logged every second
+    if self.sm.frame % int(1. / DT_CTRL) == 0:
+      self.publish_profile()
+
+  def publish_profile(self):
+    dat = self.pm.new_message('controlsProfile')
+    self.prof.fill_stats(dat.controlsProfile)
+    self.rk.fill_stats(dat.controlsProfile.ratekeeper)
+    self.pm.send('controlsProfile', dat)
 
   def controlsd_thread(self):
     while True:
       self.step()
       self.rk.monitor_time()
-      self.prof.display()
 
 def main(sm=None, pm=None, logcan=None):
   controls = Controls(sm, pm, logcan)
@@ -1,7 +1,9 @@
 import os
 import copy
 import json
-from typing import List, Optional
+import heapq
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from cereal import car, log
 from common.basedir import BASEDIR
@@ -26,10 +28,21 @@ def set_offroad_alert(alert: str, show_alert: bool, extra_text: Optional[str] =
     Params().delete(alert)
 
 
+class ActiveAlert(NamedTuple):
+  alert: Alert
+  start_time: float
+  seq: int
+
+
 class AlertManager:
 
   def __init__(self):
-    self.activealerts: List[Alert] = []
+    # latest occurrence of each active alert, by event type and alert type
+    self.active_alerts: Dict[str, Dict[str, ActiveAlert]] = defaultdict(dict)
+    # (-priority, -start_time, seq, event type, alert type), entries are dropped lazily once superseded or expired
+    self.heap: List[Tuple[int, float, int, str, str]] = []
+    self.seq = 0
+    self.current_alert: Optional[ActiveAlert] = None
     self.clear_current_alert()
 
   def clear_current_alert(self) -> None:
@@ -43,41 +56,71 @@ class AlertManager:
     self.alert_rate: float = 0.
 
   def add_many(self, frame: int, alerts: List[Alert], enabled: bool = True) -> None:
+    start_time = frame * DT_CTRL
+    top = self.current_alert.alert if self.current_alert is not None else None
     for alert in alerts:
-      added_alert = copy.copy(alert)
-      added_alert.start_time = frame * DT_CTRL
-
       # if new alert is higher priority, log it
-      if not len(self.activealerts) or added_alert.alert_priority > self.activealerts[0].alert_priority:
-        cloudlog.event('alert_add', alert_type=added_alert.alert_type, enabled=enabled)
+      if top is None or alert.alert_priority > top.alert_priority:
+        cloudlog.event('alert_add', alert_type=alert.alert_type, enabled=enabled)
+        if top is None:
+          top = alert
+
+      # an alert that is added again replaces its earlier occurrence, which could never be selected over it
+      self.seq += 1
+      self.active_alerts[alert.event_type][alert.alert_type] = ActiveAlert(alert, start_time, self.seq)
+      heapq.heappush(self.heap, (-alert.alert_priority, -start_time, self.seq, alert.event_type, alert.alert_type))
 
-      self.activealerts.append(added_alert)
+  def _num_active_alerts(self) -> int:
+    return sum(len(alerts) for alerts in self.active_alerts.values())
 
   def process_alerts(self, frame: int, clear_event_type=None) -> None:
     cur_time = frame * DT_CTRL
 
-    # first get rid of all the expired alerts
-    self.activealerts = [a for a in self.activealerts if a.event_type != clear_event_type and
-                         a.start_time + max(a.duration_sound, a.duration_hud_alert, a.duration_text) > cur_time]
+    if clear_event_type is not None:
+      self.active_alerts.pop(clear_event_type, None)
+
+    # highest priority, most recent alert that isn't superseded, cleared or expired
+    current_alert, current_alert_type = None, ""
+    while self.heap:
+      _, _, seq, event_type, alert_type = self.heap[0]
+      active = self.active_alerts[event_type].get(alert_type) if event_type in self.active_alerts else None
+      if active is None or active.seq != seq:
+        heapq.heappop(self.heap)
+        continue
+
+      a = active.alert
+      if active.start_time + max(a.duration_sound, a.duration_hud_alert, a.duration_text) <= cur_time:
+        del self.active_alerts[event_type][alert_type]
+        heapq.heappop(self.heap)
+        continue
+
+      current_alert, current_alert_type = active, alert_type
+      break
+
+    # superseded entries below the top pile up while an alert stays active, compact once they dominate
+    if len(self.heap) > 32 and len(self.heap) > 4 * self._num_active_alerts():
+      self.heap = [(-x.alert.alert_priority, -x.start_time, x.seq, event_type, alert_type)
+                   for event_type, alerts in self.active_alerts.items() for alert_type, x in alerts.items()]
+      heapq.heapify(self.heap)
 
-    # sort by priority first and then by start_time
-    self.activealerts.sort(key=lambda k: (k.alert_priority, k.start_time), reverse=True)
+    self.current_alert = current_alert
 
     # start with assuming no alerts
     self.clear_current_alert()
 
-    if len(self.activealerts):
-      current_alert = self.activealerts[0]
+    if current_alert is not None:
+      start_time = current_alert.start_time
+      current_alert = current_alert.alert
 
-      self.alert_type = current_alert.alert_type
+      self.alert_type = current_alert_type
 
-      if current_alert.start_time + current_alert.duration_sound > cur_time:
+      if start_time + current_alert.duration_sound > cur_time:
         self.audible_alert = current_alert.audible_alert
 
-      if current_alert.start_time + current_alert.duration_hud_alert > cur_time:
+      if start_time + current_alert.duration_hud_alert > cur_time:
         self.visual_alert = current_alert.visual_alert
 
-      if current_alert.start_time + current_alert.duration_text > cur_time:
+      if start_time + current_alert.duration_text > cur_time:
         self.alert_text_1 = current_alert.alert_text_1
         self.alert_text_2 = current_alert.alert_text_2
         self.alert_status = current_alert.alert_status
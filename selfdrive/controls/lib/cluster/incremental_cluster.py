@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class IncrementalClusterer():
+  """Centroid linkage clustering that starts from the clusters of the previous frame.
+
+  Tracks seen before start in their previous cluster, new tracks and tracks of a cluster that lost tracks start
+  on their own. A kept cluster is checked every frame against the largest merge distance it was built with: it
+  is dissolved once any of its tracks moved move_tol relative to its centroid, or once replaying its merges with
+  the moved tracks could reach dist. Clusters are then merged closest first while their centroids are within dist.
+
+  The merges of a kept cluster stay within dist, but a track that moved less than move_tol stays in its cluster
+  even when a fresh centroid linkage would now merge it in a different order, so the result can differ from
+  cutting a fresh tree at dist until a track moves move_tol. For a stable scene this is a single pass over the tracks and
+  one distance check between the cluster centroids."""
+  def __init__(self, dist, move_tol=0.1):
+    self.dist = dist
+    self.dist_sq = dist ** 2
+    self.move_tol = move_tol
+    self.ids = np.zeros(0, dtype=np.int64)
+    self.labels = np.zeros(0, dtype=np.int64)
+    self.cnt = np.zeros(0, dtype=np.int64)
+    self.heights = np.zeros(0)  # largest merge distance of each cluster, when its offsets were taken
+    self.offsets = np.zeros((0, 0))
+
+  def update(self, ids, pts):
+    """ids must be sorted, returns the cluster index of every point. Clusters are numbered by their first point"""
+    ids = np.asarray(ids, dtype=np.int64)
+    n = len(ids)
+    if n <= 1:
+      self.ids, self.labels = ids, np.zeros(n, dtype=np.int64)
+      self.cnt = np.ones(n, dtype=np.int64)
+      self.heights = np.zeros(n)
+      self.offsets = np.zeros((n, len(pts[0]) if n else 0))
+      return self.labels
+    pts = np.asarray(pts, dtype=np.float64)
+
+    if np.array_equal(ids, self.ids):
+      # same tracks as the previous frame
+      groups, cnt, heights, ref_offsets = self.labels, self.cnt, self.heights, self.offsets
+      changed = np.zeros(n, dtype=bool)
+    else:
+      # seed from the previous clusters, new tracks get a cluster of their own
+      groups = np.arange(n) + len(self.cnt)
+      heights = np.concatenate((self.heights, np.zeros(n)))
+      ref_offsets = np.zeros_like(pts)
+      changed = np.zeros(n, dtype=bool)
+      if len(self.ids):
+        prev = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        seen = self.ids[prev] == ids
+        prev = prev[seen]
+        groups[seen] = self.labels[prev]
+        ref_offsets[seen] = self.offsets[prev]
+        # clusters that lost tracks
+        lost = np.bincount(self.labels[prev], minlength=len(self.cnt)) < self.cnt
+        changed[seen] = lost[self.labels[prev]]
+      uniq, groups = np.unique(groups, return_inverse=True)
+      heights = heights[uniq]
+      cnt = np.bincount(groups)
+
+    # every merge distance within a cluster grows by at most twice the largest move of its tracks
+    centroids = self._centroids(groups, pts, cnt)
+    drift = np.sqrt(np.sum((pts - centroids[groups] - ref_offsets) ** 2, axis=1))
+    max_drift = np.zeros(len(cnt))
+    np.maximum.at(max_drift, groups, drift)
+    changed |= drift >= self.move_tol
+    split = (np.bincount(groups, changed, len(cnt)) > 0) | (heights + 2 * max_drift >= self.dist)
+
+    # a cluster is only kept if it's still within dist and kept all its tracks, otherwise its tracks start over
+    split &= cnt > 1
+    if np.any(split):
+      reset = split[groups]
+      groups = groups.copy()
+      groups[reset] = len(cnt) + np.arange(np.count_nonzero(reset))
+      uniq, groups = np.unique(groups, return_inverse=True)
+      heights = np.concatenate((heights, np.zeros(np.count_nonzero(reset))))[uniq]
+      cnt = np.bincount(groups)
+      centroids = self._centroids(groups, pts, cnt)
+      max_drift = np.zeros(len(cnt))
+      np.maximum.at(max_drift, groups, np.where(reset, 0., drift))
+    else:
+      reset = np.zeros(n, dtype=bool)
+
+    merged = self._merge(centroids, cnt.astype(np.float64), heights + 2 * max_drift)
+    if merged is None and not np.any(reset) and groups is self.labels:
+      # nothing changed, the labels and reference offsets are kept
+      return groups
+
+    if merged is not None:
+      roots, merged_heights = merged
+      is_merged = np.bincount(roots, minlength=len(roots)) > 1
+      heights = np.where(is_merged, merged_heights, heights)
+      reset |= is_merged[roots[groups]]
+      groups = roots[groups]
+
+    # number clusters in order of their first point
+    uniq, first, labels = np.unique(groups, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    labels = order[labels]
+    self.heights = np.empty(len(uniq))
+    self.heights[order] = heights[uniq]
+    cnt = np.bincount(labels)
+    offsets = pts - self._centroids(labels, pts, cnt)[labels]
+    self.ids, self.labels, self.cnt = ids, labels, cnt
+    self.offsets = np.where(reset[:, None], offsets, ref_offsets)
+    return labels
+
+  @staticmethod
+  def _centroids(groups, pts, cnt):
+    return np.column_stack([np.bincount(groups, pts[:, i]) for i in range(pts.shape[1])]) / cnt[:, None]
+
+  def _merge(self, centroids, cnt, heights):
+    """Returns the cluster each cluster is merged into and the largest merge distance of every resulting cluster,
+    None when there is nothing to merge"""
+    k = len(cnt)
+    d = np.sum((centroids[:, None, :] - centroids[None, :, :]) ** 2, axis=2)
+    d[np.diag_indices(k)] = np.inf
+    if k < 2 or d.min() >= self.dist_sq:
+      return None
+
+    # merge the closest pair until none is within dist, with the Lance-Williams update for centroid linkage
+    roots = np.arange(k)
+    heights = heights.copy()
+    while True:
+      i, j = np.unravel_index(np.argmin(d), d.shape)
+      d_ij = d[i, j]
+      if d_ij >= self.dist_sq:
+        break
+      n_i, n_j = cnt[i], cnt[j]
+      n = n_i + n_j
+      d[i] = (n_i * d[i] + n_j * d[j]) / n - n_i * n_j * d_ij / (n * n)
+      d[:, i] = d[i]
+      d[i, i] = np.inf
+      d[j] = np.inf
+      d[:, j] = np.inf
+      cnt[i] = n
+      heights[i] = max(heights[i], heights[j], np.sqrt(d_ij))
+      roots[roots == j] = i
+    return roots, heights
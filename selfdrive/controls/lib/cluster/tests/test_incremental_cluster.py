@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+
+from selfdrive.controls.lib.cluster.fastcluster_py import cluster_points_centroid
+from selfdrive.controls.lib.cluster.incremental_cluster import IncrementalClusterer
+
+DIST = 2.5
+
+
+def partition(labels):
+  """Clusters as sets of point indices, so labelings can be compared up to relabeling"""
+  groups = {}
+  for i, label in enumerate(labels):
+    groups.setdefault(label, set()).add(i)
+  return sorted(sorted(g) for g in groups.values())
+
+
+def group(center, n, spread=0.5):
+  # points within spread of center, far below the clustering distance
+  offsets = np.linspace(-spread, spread, n)
+  return [(center[0] + o, center[1] - o, center[2] + o / 2) for o in offsets]
+
+
+class TestIncrementalClusterer(unittest.TestCase):
+  def setUp(self):
+    self.clusterer = IncrementalClusterer(DIST)
+
+  def assertMatchesReference(self, ids, pts):
+    labels = self.clusterer.update(ids, pts)
+    self.assertEqual(len(labels), len(ids))
+    ref = cluster_points_centroid(pts, DIST) if len(pts) > 1 else [0] * len(pts)
+    self.assertEqual(partition(labels), partition(ref))
+
+  def test_empty_and_single(self):
+    self.assertEqual(len(self.clusterer.update([], np.zeros((0, 3)))), 0)
+    self.assertEqual(list(self.clusterer.update([7], [(10., 1., -2.)])), [0])
+    self.assertEqual(len(self.clusterer.update([], np.zeros((0, 3)))), 0)
+    self.assertMatchesReference([1, 2], [(10., 1., -2.), (10.5, 1., -2.)])
+
+  def test_random(self):
+    np.random.seed(0)
+    for _ in range(200):
+      n = np.random.randint(2, 40)
+      ids = np.arange(n) + np.random.randint(0, 1000)
+      pts = np.random.uniform([0., -10., -10.], [60., 10., 10.], (n, 3))
+      # a fresh clusterer for every set, and one that sees only new tracks every frame
+      self.assertMatchesReference(ids, pts)
+      self.assertEqual(partition(IncrementalClusterer(DIST).update(ids, pts)), partition(self.clusterer.labels))
+
+  def test_static_scene(self):
+    np.random.seed(1)
+    ids = np.arange(30)
+    pts = np.random.uniform([0., -10., -10.], [60., 10., 10.], (30, 3))
+    for _ in range(10):
+      self.assertMatchesReference(ids, pts)
+    # the whole scene moving together
+    for i in range(10):
+      self.assertMatchesReference(ids, pts + (-0.3 * i, 0.05 * i, 0.))
+
+  def test_split(self):
+    ids = np.arange(8)
+    pts = np.array(group((20., 0., 0.), 4) + group((40., 4., 1.), 4))
+    self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 2)
+
+    # half of the first cluster drives away, a step at a time
+    for _ in range(7):
+      pts[2:4, 0] += 1.5
+      self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 3)
+
+  def test_merge(self):
+    ids = np.arange(6)
+    pts = np.array(group((20., 0., 0.), 3) + group((35., 0., 0.), 3))
+    self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 2)
+
+    # the second cluster closes in on the first
+    for _ in range(10):
+      pts[3:, 0] -= 1.5
+      self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 1)
+
+  def test_drifting_pair(self):
+    # a pair close to dist drifting apart slowly, each track moves less than move_tol per frame and in total
+    # until the pair is past dist. it splits in the first frame it is more than dist apart
+    ids = np.array([1, 2])
+    gap, step = 2.312, 0.005
+    for frame in range(60):
+      d = gap + step * frame
+      pts = np.array([(20. - d / 2, 0., 0.), (20. + d / 2, 0., 0.)])
+      self.assertMatchesReference(ids, pts)
+      self.assertEqual(len(set(self.clusterer.labels)), 1 if d < DIST else 2, f"frame {frame}, gap {d:.3f}")
+    self.assertEqual(int(np.ceil((DIST - gap) / step)), 38)
+
+  def test_lost_and_new_tracks(self):
+    # the middle track holds the chain together, without it the outer two are too far apart
+    ids = np.array([1, 2, 3])
+    pts = np.array([(20., 0., 0.), (21.5, 0., 0.), (23., 0., 0.)])
+    self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 1)
+
+    self.assertMatchesReference(ids[[0, 2]], pts[[0, 2]])
+    self.assertEqual(len(set(self.clusterer.labels)), 2)
+
+    # a new track in between joins them again, and a far one starts its own cluster
+    ids = np.array([1, 3, 4, 9])
+    pts = np.array([(20., 0., 0.), (23., 0., 0.), (21.5, 0., 0.), (50., 0., 0.)])
+    self.assertMatchesReference(ids, pts)
+    self.assertEqual(len(set(self.clusterer.labels)), 2)
+
+  def test_random_track_changes(self):
+    # tracks appear and disappear between frames of well separated groups
+    np.random.seed(2)
+    centers = [(10. + 12. * k, 4. * (k % 3) - 4., 0.) for k in range(5)]
+    all_pts = np.array(sum((group(c, 5) for c in centers), []))
+    for _ in range(50):
+      keep = np.sort(np.random.choice(len(all_pts), np.random.randint(2, len(all_pts)), replace=False))
+      self.assertMatchesReference(keep, all_pts[keep])
+
+
+if __name__ == "__main__":
+  unittest.main()
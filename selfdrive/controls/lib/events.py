@@ -1,5 +1,7 @@
 from enum import IntEnum
-from typing import Dict, Union, Callable, Any
+from typing import Dict, List, Union, Callable, Any
+
+import numpy as np
 
 from cereal import log, car
 import cereal.messaging as messaging
@@ -44,7 +46,11 @@ class Events:
   def __init__(self):
     self.events = []
     self.static_events = []
-    self.events_prev = dict.fromkeys(EVENTS.keys(), 0)
+    # consecutive frames each event has been active for, indexed by EventName value
+    self.events_prev = np.zeros(NUM_EVENT_NAMES, dtype=np.int64)
+    self.events_prev_active = np.zeros(0, dtype=np.int64)
+    self.msg_cache_key = None
+    self.msg_cache = []
 
   @property
   def names(self):
@@ -59,12 +65,18 @@ class Events:
     self.events.append(event_name)
 
   def clear(self):
-    self.events_prev = {k: (v + 1 if k in self.events else 0) for k, v in self.events_prev.items()}
+    # only touch the counters of events that were active last frame or are active now
+    active = np.array(list(dict.fromkeys(self.events)), dtype=np.int64)
+    counts = self.events_prev[active] + 1
+    self.events_prev[self.events_prev_active] = 0
+    self.events_prev[active] = counts
+    self.events_prev_active = active
     self.events = self.static_events.copy()
 
   def any(self, event_type):
+    bit = ET_BITS.get(event_type, 0)
     for e in self.events:
-      if event_type in EVENTS.get(e, {}).keys():
+      if EVENT_TYPE_MASKS[e] & bit:
         return True
     return False
 
@@ -72,12 +84,19 @@ class Events:
     if callback_args is None:
       callback_args = []
 
+    types_mask = 0
+    for et in event_types:
+      types_mask |= ET_BITS.get(et, 0)
+
     ret = []
     for e in self.events:
-      types = EVENTS[e].keys()
+      if not EVENT_TYPE_MASKS[e] & types_mask:
+        continue
+
+      alerts = EVENTS[e]
       for et in event_types:
-        if et in types:
-          alert = EVENTS[e][et]
+        if et in alerts:
+          alert = alerts[et]
           if not isinstance(alert, Alert):
             alert = alert(*callback_args)
 
@@ -92,14 +111,24 @@ class Events:
       self.events.append(e.name.raw)
 
   def to_msg(self):
-    ret = []
-    for event_name in self.events:
-      event = car.CarEvent.new_message()
-      event.name = event_name
-      for event_type in EVENTS.get(event_name, {}).keys():
-        setattr(event, event_type, True)
-      ret.append(event)
-    return ret
+    # the active events rarely change between frames, reuse the last list if they didn't
+    key = tuple(self.events)
+    if key != self.msg_cache_key:
+      self.msg_cache_key = key
+      self.msg_cache = [car_event_template(e) for e in key]
+    return list(self.msg_cache)
+
+
+def car_event_template(event_name):
+  """Prebuilt CarEvent with its event type flags set, shared by all Events"""
+  event = CAR_EVENT_TEMPLATES.get(event_name)
+  if event is None:
+    builder = car.CarEvent.new_message()
+    builder.name = event_name
+    for event_type in EVENT_TYPES[event_name]:
+      setattr(builder, event_type, True)
+    event = CAR_EVENT_TEMPLATES[event_name] = builder.as_reader()
+  return event
 
 # 메세지 한글화 : 로웰 ( https://github.com/crwusiz/openpilot )
 
@@ -1084,3 +1113,17 @@ EVENTS: Dict[int, Dict[str, Union[Alert, Callable[[Any, messaging.SubMaster, boo
   },
 
 }
+
+
+# Precomputed dispatch tables, indexed by EventName value
+ALL_EVENT_TYPES = [ET.ENABLE, ET.PRE_ENABLE, ET.NO_ENTRY, ET.WARNING, ET.USER_DISABLE,
+                   ET.SOFT_DISABLE, ET.IMMEDIATE_DISABLE, ET.PERMANENT]
+ET_BITS = {et: 1 << i for i, et in enumerate(ALL_EVENT_TYPES)}
+NUM_EVENT_NAMES = max(EVENT_NAME) + 1
+
+EVENT_TYPES: List[List[str]] = [[] for _ in range(NUM_EVENT_NAMES)]
+EVENT_TYPE_MASKS: List[int] = [0] * NUM_EVENT_NAMES
+CAR_EVENT_TEMPLATES: Dict[int, Any] = {}
+for _e, _alerts in EVENTS.items():
+  EVENT_TYPES[_e] = list(_alerts.keys())
+  EVENT_TYPE_MASKS[_e] = sum(ET_BITS[et] for et in _alerts)
@@ -12,8 +12,11 @@ MPC_T = list(np.arange(0,1.,.2)) + list(np.arange(1.,10.6,.6))
 
 
 class LeadMpc():
-  def __init__(self, mpc_id):
+  def __init__(self, mpc_id, skip_without_lead=False):
     self.lead_id = mpc_id
+    # only keep the mpc running on a fake lead when its solution is used without a lead
+    self.skip_without_lead = skip_without_lead
+    self.solved = False
 
     self.reset_mpc()
     self.prev_lead_status = False
@@ -53,6 +56,7 @@ class LeadMpc():
     else:
       lead = radarstate.leadTwo
     self.status = lead.status
+    had_lead = self.prev_lead_status
 
     # Setup current mpc state
     self.cur_state[0].x_ego = 0.0
@@ -78,6 +82,12 @@ class LeadMpc():
       self.cur_state[0].v_l = v_lead
     else:
       self.prev_lead_status = False
+      if self.skip_without_lead and not had_lead:
+        # the last solve already ran on the fake lead, and a new lead reinitializes the mpc anyway
+        self.solved = False
+        self.a_lead_tau = _LEAD_ACCEL_TAU
+        return
+
       # Fake a fast lead car, so mpc keeps running
       self.cur_state[0].x_l = 50.0
       self.cur_state[0].v_l = v_ego + 10.0
@@ -91,6 +101,7 @@ class LeadMpc():
     self.a_solution = interp(T_IDXS[:CONTROL_N], MPC_T, self.mpc_solution.a_ego)
     self.j_solution = interp(T_IDXS[:CONTROL_N], MPC_T[:-1], self.mpc_solution.j_ego)
     self.duration = int((sec_since_boot() - t) * 1e9)
+    self.solved = True
 
     # Reset if NaN or goes through lead car
     crashing = any(lead - ego < -50 for (lead, ego) in zip(self.mpc_solution[0].x_l, self.mpc_solution[0].x_ego))
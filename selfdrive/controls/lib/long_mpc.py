@@ -16,6 +16,9 @@ class LongitudinalMpc():
     self.status = True
     self.min_a = -1.2
     self.max_a = 1.2
+    self.n_its = 0
+    self.duration = 0
+    self.solved = False
 
 
   def reset_mpc(self):
@@ -54,18 +57,20 @@ class LongitudinalMpc():
 
   def update_with_xva(self, poss, speeds, accels):
     # Calculate mpc
-    self.libmpc.run_mpc(self.cur_state, self.mpc_solution,
-                        list(poss), list(speeds), list(accels),
-                        self.min_a, self.max_a)
+    t = sec_since_boot()
+    self.n_its = self.libmpc.run_mpc(self.cur_state, self.mpc_solution,
+                                     list(poss), list(speeds), list(accels),
+                                     self.min_a, self.max_a)
 
     self.v_solution = list(self.mpc_solution.v_ego)
     self.a_solution = list(self.mpc_solution.a_ego)
     self.j_solution = list(self.mpc_solution.j_ego)
+    self.duration = int((sec_since_boot() - t) * 1e9)
+    self.solved = True
 
     # Reset if NaN or goes through lead car
     nans = any(math.isnan(x) for x in self.mpc_solution[0].v_ego)
 
-    t = sec_since_boot()
     if nans:
       if t > self.last_cloudlog_t + 5.0:
         self.last_cloudlog_t = t
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import math
+from bisect import bisect_left
+
 import numpy as np
 from common.numpy_fast import interp
 
@@ -7,6 +9,7 @@ import cereal.messaging as messaging
 from cereal import log
 from common.realtime import DT_MDL
 from common.realtime import sec_since_boot
+from common.profiler import HistogramProfiler
 from selfdrive.modeld.constants import T_IDXS
 from selfdrive.config import Conversions as CV
 from selfdrive.controls.lib.fcw import FCWChecker
@@ -26,6 +29,9 @@ A_CRUISE_MAX_BP = [0., 15., 25., 40.]
 _A_TOTAL_MAX_V = [1.7, 3.2]
 _A_TOTAL_MAX_BP = [20., 40.]
 
+# upper edges of the qp iteration count histogram of each mpc
+MPC_ITERATION_EDGES = [1., 2., 5., 10., 20., 50., float('inf')]
+
 
 def get_max_accel(v_ego):
   return interp(v_ego, A_CRUISE_MAX_BP, A_CRUISE_MAX_VALS)
@@ -49,9 +55,14 @@ class Planner():
     self.CP = CP
     self.mpcs = {}
     self.mpcs['lead0'] = LeadMpc(0)
-    self.mpcs['lead1'] = LeadMpc(1)
+    # lead1 is only used when there is a second lead, see LeadMpc.skip_without_lead
+    self.mpcs['lead1'] = LeadMpc(1, skip_without_lead=True)
     self.mpcs['cruise'] = LongitudinalMpc()
 
+    # mpc solve durations, iterations and skipped solves, published every second
+    self.prof = HistogramProfiler()
+    self.reset_solver_stats()
+
     self.fcw = False
     self.fcw_checker = FCWChecker()
 
@@ -105,6 +116,7 @@ class Planner():
     for key in self.mpcs:
       self.mpcs[key].set_cur_state(self.v_desired, self.a_desired)
       self.mpcs[key].update(sm['carState'], sm['radarState'], v_cruise)
+      self.record_solve(key)
       if self.mpcs[key].status and self.mpcs[key].a_solution[5] < next_a:  # picks slowest solution from accel in ~0.2 seconds
         self.longitudinalPlanSource = key
         self.v_desired_trajectory = self.mpcs[key].v_solution[:CONTROL_N]
@@ -130,6 +142,18 @@ class Planner():
     self.a_desired = float(interp(DT_MDL, T_IDXS[:CONTROL_N], self.a_desired_trajectory))
     self.v_desired = self.v_desired + DT_MDL * (self.a_desired + a_prev)/2.0
 
+  def reset_solver_stats(self):
+    self.solver_stats = {key: [0, 0, [0] * len(MPC_ITERATION_EDGES)] for key in self.mpcs}  # solves, skipped, iterations
+
+  def record_solve(self, key):
+    mpc, stats = self.mpcs[key], self.solver_stats[key]
+    if mpc.solved:
+      self.prof.record(key, mpc.duration)
+      stats[0] += 1
+      stats[2][bisect_left(MPC_ITERATION_EDGES, mpc.n_its)] += 1
+    else:
+      stats[1] += 1
+
   def publish(self, sm, pm):
     plan_send = messaging.new_message('longitudinalPlan')
 
@@ -148,3 +172,22 @@ class Planner():
     longitudinalPlan.fcw = self.fcw
 
     pm.send('longitudinalPlan', plan_send)
+
+    # plannerProfile - mpc solver stats, logged every second
+    self.prof.step()
+    if self.prof.steps >= int(1. / DT_MDL):
+      self.publish_profile(pm)
+
+  def publish_profile(self, pm):
+    dat = messaging.new_message('plannerProfile')
+    profile = dat.plannerProfile
+    self.prof.fill_stats(profile)
+    solvers = profile.init('solvers', len(self.solver_stats))
+    for solver, (key, (solves, skipped, iterations)) in zip(solvers, self.solver_stats.items()):
+      solver.name = key
+      solver.solves = solves
+      solver.skipped = skipped
+      solver.iterationEdges = MPC_ITERATION_EDGES
+      solver.iterationHistogram = iterations
+    self.reset_solver_stats()
+    pm.send('plannerProfile', dat)
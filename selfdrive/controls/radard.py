@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 import importlib
-import math
-from collections import defaultdict, deque
+from collections import deque
+
+import numpy as np
 
 import cereal.messaging as messaging
 from cereal import car
 from common.numpy_fast import interp
 from common.params import Params
 from common.realtime import Ratekeeper, Priority, config_realtime_process
+from selfdrive.car.interfaces import RADAR_POINT_DTYPE
 from selfdrive.config import RADAR_TO_CAMERA
-from selfdrive.controls.lib.cluster.fastcluster_py import cluster_points_centroid
-from selfdrive.controls.lib.radar_helpers import Cluster, Track
+from selfdrive.controls.lib.cluster.incremental_cluster import IncrementalClusterer
+from selfdrive.controls.lib.radar_helpers import Clusters, Tracks, get_RadarState_from_vision
 from selfdrive.swaglog import cloudlog
 from selfdrive.hardware import TICI
 
@@ -32,65 +34,69 @@ class KalmanParams():
 
 
 def laplacian_cdf(x, mu, b):
-  b = max(b, 1e-4)
-  return math.exp(-abs(x-mu)/b)
-
-
-def match_vision_to_cluster(v_ego, lead, clusters):
-  # match vision point to best statistical cluster match
-  offset_vision_dist = lead.x[0] - RADAR_TO_CAMERA
+  b = np.maximum(b, 1e-4)
+  return np.exp(-np.abs(x-mu)/b)
 
-  def prob(c):
-    prob_d = laplacian_cdf(c.dRel, offset_vision_dist, lead.xStd[0])
-    prob_y = laplacian_cdf(c.yRel, -lead.y[0], lead.yStd[0])
-    prob_v = laplacian_cdf(c.vRel + v_ego, lead.v[0], lead.vStd[0])
 
-    # This is isn't exactly right, but good heuristic
-    return prob_d * prob_y * prob_v
+def match_vision_to_clusters(v_ego, leads, clusters):
+  """Matches every vision lead to its best statistical cluster match, all leads are scored at once"""
+  # one row per lead, one column per cluster
+  offset_vision_dist = np.array([[lead.x[0] - RADAR_TO_CAMERA] for lead in leads])
+  lead_y = np.array([[lead.y[0]] for lead in leads])
+  lead_v = np.array([[lead.v[0]] for lead in leads])
+  prob_d = laplacian_cdf(clusters.dRel, offset_vision_dist, np.array([[lead.xStd[0]] for lead in leads]))
+  prob_y = laplacian_cdf(clusters.yRel, -lead_y, np.array([[lead.yStd[0]] for lead in leads]))
+  prob_v = laplacian_cdf(clusters.vRel + v_ego, lead_v, np.array([[lead.vStd[0]] for lead in leads]))
 
-  cluster = max(clusters, key=prob)
+  # This is isn't exactly right, but good heuristic
+  best = np.argmax(prob_d * prob_y * prob_v, axis=1)
 
-  # if no 'sane' match is found return -1
+  # if no 'sane' match is found return None
   # stationary radar points can be false positives
-  dist_sane = abs(cluster.dRel - offset_vision_dist) < max([(offset_vision_dist)*.25, 5.0])
-  vel_sane = (abs(cluster.vRel + v_ego - lead.v[0]) < 10) or (v_ego + cluster.vRel > 3)
-  if dist_sane and vel_sane:
-    return cluster
-  else:
-    return None
-
-
-def get_lead(v_ego, ready, clusters, lead_msg, low_speed_override=True):
-  # Determine leads, this is where the essential logic happens
-  if len(clusters) > 0 and ready and lead_msg.prob > .5:
-    cluster = match_vision_to_cluster(v_ego, lead_msg, clusters)
-  else:
-    cluster = None
-
-  lead_dict = {'status': False}
-  if cluster is not None:
-    lead_dict = cluster.get_RadarState(lead_msg.prob)
-  elif (cluster is None) and ready and (lead_msg.prob > .5):
-    lead_dict = Cluster().get_RadarState_from_vision(lead_msg, v_ego)
-
-  if low_speed_override:
-    low_speed_clusters = [c for c in clusters if c.potential_low_speed_lead(v_ego)]
-    if len(low_speed_clusters) > 0:
-      closest_cluster = min(low_speed_clusters, key=lambda c: c.dRel)
-
-      # Only choose new cluster if it is actually closer than the previous one
-      if (not lead_dict['status']) or (closest_cluster.dRel < lead_dict['dRel']):
-        lead_dict = closest_cluster.get_RadarState()
-
-  return lead_dict
+  offset_vision_dist, lead_v = offset_vision_dist[:, 0], lead_v[:, 0]
+  d_rel, v_rel = clusters.dRel[best], clusters.vRel[best]
+  dist_sane = np.abs(d_rel - offset_vision_dist) < np.maximum(offset_vision_dist * .25, 5.0)
+  vel_sane = (np.abs(v_rel + v_ego - lead_v) < 10) | (v_ego + v_rel > 3)
+  return [int(c) if sane else None for c, sane in zip(best, dist_sane & vel_sane)]
+
+
+def get_leads(v_ego, ready, clusters, lead_msgs):
+  """Determine leads, this is where the essential logic happens.
+  Only the first lead falls back to the closest potential low speed lead"""
+  use_vision = [ready and lead_msg.prob > .5 for lead_msg in lead_msgs]
+  matches = [None] * len(lead_msgs)
+  if len(clusters) > 0 and any(use_vision):
+    vision_leads = [i for i, use in enumerate(use_vision) if use]
+    for i, cluster in zip(vision_leads, match_vision_to_clusters(v_ego, [lead_msgs[i] for i in vision_leads], clusters)):
+      matches[i] = cluster
+
+  lead_dicts = []
+  for lead_msg, use, cluster in zip(lead_msgs, use_vision, matches):
+    lead_dict = {'status': False}
+    if cluster is not None:
+      lead_dict = clusters.get_RadarState(cluster, lead_msg.prob)
+    elif use:
+      lead_dict = get_RadarState_from_vision(lead_msg, v_ego)
+    lead_dicts.append(lead_dict)
+
+  low_speed_clusters = np.flatnonzero(clusters.potential_low_speed_leads(v_ego))
+  if len(lead_dicts) and len(low_speed_clusters) > 0:
+    closest_cluster = low_speed_clusters[np.argmin(clusters.dRel[low_speed_clusters])]
+
+    # Only choose new cluster if it is actually closer than the previous one
+    if (not lead_dicts[0]['status']) or (clusters.dRel[closest_cluster] < lead_dicts[0]['dRel']):
+      lead_dicts[0] = clusters.get_RadarState(closest_cluster)
+
+  return lead_dicts
 
 
 class RadarD():
   def __init__(self, radar_ts, delay=0):
     self.current_time = 0
 
-    self.tracks = defaultdict(dict)
     self.kalman_params = KalmanParams(radar_ts)
+    self.tracks = Tracks(self.kalman_params)
+    self.clusterer = IncrementalClusterer(2.5)
 
     # v_ego
     self.v_ego = 0.
@@ -98,7 +104,8 @@ class RadarD():
 
     self.ready = False
 
-  def update(self, sm, rr, enable_lead):
+  def update(self, sm, rr, enable_lead, points=None):
+    """points are the radar points of rr as a RADAR_POINT_DTYPE array, read from rr if not given"""
     self.current_time = 1e-9*max(sm.logMonoTime.values())
 
     if sm.updated['carState']:
@@ -107,54 +114,20 @@ class RadarD():
     if sm.updated['modelV2']:
       self.ready = True
 
-    ar_pts = {}
-    for pt in rr.points:
-      ar_pts[pt.trackId] = [pt.dRel, pt.yRel, pt.vRel, pt.measured]
-
-    # *** remove missing points from meta data ***
-    for ids in list(self.tracks.keys()):
-      if ids not in ar_pts:
-        self.tracks.pop(ids, None)
-
     # *** compute the tracks ***
-    for ids in ar_pts:
-      rpt = ar_pts[ids]
-
-      # align v_ego by a fixed time to align it with the radar measurement
-      v_lead = rpt[2] + self.v_ego_hist[0]
-
-      # create the track if it doesn't exist or it's a new track
-      if ids not in self.tracks:
-        self.tracks[ids] = Track(v_lead, self.kalman_params)
-      self.tracks[ids].update(rpt[0], rpt[1], rpt[2], v_lead, rpt[3])
-
-    idens = list(sorted(self.tracks.keys()))
-    track_pts = list([self.tracks[iden].get_key_for_cluster() for iden in idens])
-
-    # If we have multiple points, cluster them
-    if len(track_pts) > 1:
-      cluster_idxs = cluster_points_centroid(track_pts, 2.5)
-      clusters = [None] * (max(cluster_idxs) + 1)
-
-      for idx in range(len(track_pts)):
-        cluster_i = cluster_idxs[idx]
-        if clusters[cluster_i] is None:
-          clusters[cluster_i] = Cluster()
-        clusters[cluster_i].add(self.tracks[idens[idx]])
-    elif len(track_pts) == 1:
-      # FIXME: cluster_point_centroid hangs forever if len(track_pts) == 1
-      cluster_idxs = [0]
-      clusters = [Cluster()]
-      clusters[0].add(self.tracks[idens[0]])
-    else:
-      clusters = []
+    if points is None:
+      points = np.array([(pt.trackId, pt.dRel, pt.yRel, pt.vRel, pt.aRel, pt.yvRel, pt.measured) for pt in rr.points],
+                        dtype=RADAR_POINT_DTYPE)
+    v_rel = points['vRel'].astype(np.float64)
+    # align v_ego by a fixed time to align it with the radar measurement
+    v_lead = v_rel + self.v_ego_hist[0]
+    self.tracks.update(points['trackId'], points['dRel'], points['yRel'], v_rel, v_lead, points['measured'])
+
+    tracks = self.tracks
+    clusters = Clusters(tracks, self.clusterer.update(tracks.ids, tracks.get_keys_for_cluster()))
 
     # if a new point, reset accel to the rest of the cluster
-    for idx in range(len(track_pts)):
-      if self.tracks[idens[idx]].cnt <= 1:
-        aLeadK = clusters[cluster_idxs[idx]].aLeadK
-        aLeadTau = clusters[cluster_idxs[idx]].aLeadTau
-        self.tracks[idens[idx]].reset_a_lead(aLeadK, aLeadTau)
+    tracks.reset_a_lead(tracks.cnt <= 1, clusters.aLeadK[clusters.labels], clusters.aLeadTau[clusters.labels])
 
     # *** publish radarState ***
     dat = messaging.new_message('radarState')
@@ -166,9 +139,9 @@ class RadarD():
     radarState.carStateMonoTime = sm.logMonoTime['carState']
 
     if enable_lead:
-      if len(sm['modelV2'].leadsV3) > 1:
-        radarState.leadOne = get_lead(self.v_ego, self.ready, clusters, sm['modelV2'].leadsV3[0], low_speed_override=True)
-        radarState.leadTwo = get_lead(self.v_ego, self.ready, clusters, sm['modelV2'].leadsV3[1], low_speed_override=False)
+      leads_v3 = sm['modelV2'].leadsV3
+      if len(leads_v3) > 1:
+        radarState.leadOne, radarState.leadTwo = get_leads(self.v_ego, self.ready, clusters, [leads_v3[0], leads_v3[1]])
     return dat
 
 
@@ -203,6 +176,8 @@ def radard_thread(sm=None, pm=None, can_sock=None):
 
   while 1:
     can_strings = messaging.drain_sock_raw(can_sock, wait_for_one=True)
+    # only set by interfaces that fill their points with _fill_points, otherwise RD reads them from rr
+    RI.points = None
     rr = RI.update(can_strings)
 
     if rr is None:
@@ -210,8 +185,9 @@ def radard_thread(sm=None, pm=None, can_sock=None):
 
     sm.update(0)
 
-    dat = RD.update(sm, rr, enable_lead)
+    dat = RD.update(sm, rr, enable_lead, RI.points)
     dat.radarState.cumLagMs = -rk.remaining*1000.
+    rk.fill_stats(dat.radarState.ratekeeper)
 
     pm.send('radarState', dat)
 
@@ -219,12 +195,13 @@ def radard_thread(sm=None, pm=None, can_sock=None):
     tracks = RD.tracks
     dat = messaging.new_message('liveTracks', len(tracks))
 
-    for cnt, ids in enumerate(sorted(tracks.keys())):
+    for cnt, (ids, d_rel, y_rel, v_rel) in enumerate(zip(tracks.ids.tolist(), tracks.dRel.tolist(),
+                                                         tracks.yRel.tolist(), tracks.vRel.tolist())):
       dat.liveTracks[cnt] = {
         "trackId": ids,
-        "dRel": float(tracks[ids].dRel),
-        "yRel": float(tracks[ids].yRel),
-        "vRel": float(tracks[ids].vRel),
+        "dRel": d_rel,
+        "yRel": y_rel,
+        "vRel": v_rel,
       }
     pm.send('liveTracks', dat)
 
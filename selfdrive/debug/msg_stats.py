@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# Prints the messaging telemetry published by SubMaster/PubMaster created with a stats_name
+# controlsd publishes it when started with MSG_STATS=1
+import argparse
+import glob
+import os
+import time
+
+from cereal.messaging.stats import JITTER_BINS_MS, STATS_DIR, read_stats
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Show per-service latency, jitter and drops")
+  parser.add_argument("names", nargs="*", help="stats pages to show, e.g. controlsd_sub (default: all)")
+  parser.add_argument("--interval", type=float, default=1.)
+  args = parser.parse_args()
+
+  while True:
+    names = args.names or sorted(os.path.basename(p)[len("msgstats_"):] for p in glob.glob(os.path.join(STATS_DIR, "msgstats_*")))
+    for name in names:
+      print(f"--- {name}")
+      print(f"{'service':<24} {'count':>8} {'dropped':>8} {'lat ms':>7} {'max ms':>7}  jitter <= " +
+            " ".join(f"{b:>5g}" for b in JITTER_BINS_MS))
+      for row in read_stats(name):
+        print(f"{row['service'].decode():<24} {row['count']:>8} {row['dropped']:>8} {row['latency_ms']:>7.2f} {row['max_latency_ms']:>7.2f}" +
+              "            " + " ".join(f"{h:>5}" for h in row['jitter_hist']))
+    print()
+    time.sleep(args.interval)